@@ -0,0 +1,39 @@
+import utime
+
+class TickClock:
+    def __init__(self, timestep, policy='catchup', max_catchup=10):
+        # policy: 'catchup' runs missed state ticks (up to max_catchup per
+        # iteration, the rest are dropped), 'drop' skips them.
+        self.period = int(timestep * 1000000)
+        self.policy = policy
+        self.max_catchup = max_catchup
+        self.last = utime.ticks_us()
+        self.deadline = utime.ticks_add(self.last, self.period)
+        self.elapsed = 0  # us since start, accumulated so ticks_us wrap is harmless
+        self.ticks = 1  # state ticks issued, the first runs before the first wait
+        self.missed = 0
+        self.dropped = 0
+
+    def wait(self):
+        # Sleep until the next tick boundary, return how many state ticks are due
+        late = utime.ticks_diff(utime.ticks_us(), self.deadline)
+        if late < 0:
+            utime.sleep_us(-late)
+            late = 0
+        behind = late // self.period  # whole periods missed
+        self.deadline = utime.ticks_add(self.deadline, (behind + 1) * self.period)
+        due = 1
+        if behind:
+            self.missed += behind
+            if self.policy == 'catchup':
+                due += min(behind, self.max_catchup)
+            self.dropped += behind + 1 - due
+        now = utime.ticks_us()
+        self.elapsed += utime.ticks_diff(now, self.last)
+        self.last = now
+        self.ticks += due
+        return due
+
+    def drift(self):
+        # us the state clock lags behind real time (grows with dropped ticks)
+        return self.elapsed - (self.ticks - 1) * self.period
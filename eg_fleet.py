@@ -0,0 +1,121 @@
+# Host-side struct-of-arrays simulation of many creatures, for tuning the
+# State decay constants. Steps with the same rules as the StateProperty
+# subclasses in eg_state, but over NumPy arrays of N creatures.
+import numpy as np
+
+PROPERTIES = ('age', 'energy', 'attention', 'happiness', 'arousal', 'fatigue')
+
+class FleetProperty:
+    def __init__(self, prop, n):
+        self.value = np.full(n, prop.value, dtype=np.int64)
+        self.max = prop.max
+        self.wrap = prop.wrap
+        self.timebase = np.full(n, prop.timebase, dtype=np.int64)
+        self.manual_update = prop.manual_update
+
+    def add(self, inc, mask):
+        # StateProperty.add for the creatures in mask, returns its result
+        value = self.value + inc
+        over = value >= self.max
+        under = value < 0
+        value = np.where(over, 0 if self.wrap else self.max, np.where(under, 0, value))
+        self.value = np.where(mask, value, self.value)
+        return ~(over | under)
+
+    def update_event(self, time):
+        return (time % self.timebase) == 0
+
+
+class Fleet:
+    def __init__(self, state, n):
+        # Start n copies of state, use set_timebase to vary the decay constants
+        self.n = n
+        for name in PROPERTIES:
+            setattr(self, name, FleetProperty(getattr(state, name), n))
+        self.critical_level = state.energy.critical_level
+        self.time_dark = np.full(n, state.fatigue.time_dark, dtype=np.int64)
+        self.time_to_falling_asleep = np.full(n, state.fatigue.time_to_falling_asleep, dtype=np.int64)
+        self.alive = np.full(n, state.alive, dtype=bool)
+        self.asleep = np.full(n, state.asleep, dtype=bool)
+        self.dark = np.full(n, state.env.dark, dtype=bool)
+        self.sound = np.full(n, state.env.sound, dtype=bool)
+        self.generating_sound = np.full(n, state.env.generating_sound, dtype=bool)
+        self.died_at = np.full(n, -1, dtype=np.int64)  # first tick alive went False
+        self.time = state.time
+
+    def set_timebase(self, name, timebase):
+        prop = getattr(self, name)
+        prop.timebase = np.broadcast_to(np.asarray(timebase, dtype=np.int64), (self.n,)).copy()
+
+    def input_update(self, name, v, mask):
+        # StateProperty.input_update (and the energy/attention overrides)
+        prop = getattr(self, name)
+        if not prop.manual_update:
+            return
+        if name == 'energy':
+            self.happiness.add(v, mask)
+        elif name == 'attention':
+            self.arousal.add(v, mask)
+        prop.add(v, mask)
+
+    def update(self, dark=None, sound=None):
+        if dark is not None:
+            self.dark[:] = dark
+        if sound is not None:
+            self.sound[:] = sound
+        time = self.time
+        # StateAge
+        event = self.age.update_event(time)
+        self.alive = np.where(event, self.age.add(1, event), self.alive)
+        # StateEnergy
+        event = self.energy.update_event(time)
+        inc = np.where(self.asleep, -1, -2)
+        self.alive = np.where(event, self.energy.add(inc, event), self.alive)
+        # StateHappiness
+        event = self.happiness.update_event(time)
+        self.happiness.add(-2, event & (self.energy.value <= 30))
+        self.happiness.add(-3, event & (self.fatigue.value >= 80))
+        self.happiness.add(-1, event & ~self.asleep)
+        # StateArousal
+        self.arousal.value = np.where(self.asleep, 0, self.arousal.value)
+        event = self.arousal.update_event(time)
+        self.arousal.add(-1, event)
+        # StateAttention
+        self.attention.add(3, self.sound)
+        self.arousal.add(3, self.sound)
+        event = self.attention.update_event(time)
+        self.attention.add(-1, event & ~self.asleep)
+        # StateFatigue
+        wake = ~self.dark | (self.energy.value <= self.critical_level) | self.sound
+        self.asleep = self.asleep & ~wake
+        event = self.fatigue.update_event(time)
+        dark = event & self.dark
+        falling_asleep = dark & (self.time_dark >= self.time_to_falling_asleep)
+        self.asleep = self.asleep | falling_asleep
+        self.fatigue.add(-1, falling_asleep)
+        self.time_dark = np.where(dark & ~falling_asleep, self.time_dark + 1, self.time_dark)
+        light = event & ~self.dark
+        self.fatigue.add(1, light)
+        self.asleep = self.asleep & ~light
+        self.time_dark = np.where(light, 0, self.time_dark)
+
+        self.died_at = np.where((self.died_at < 0) & ~self.alive, time, self.died_at)
+        self.time = time + 1
+
+    def snapshot(self, i):
+        # Creature i in the same shape as a scalar State, for comparing runs
+        snap = {name: int(getattr(self, name).value[i]) for name in PROPERTIES}
+        snap['alive'] = bool(self.alive[i])
+        snap['asleep'] = bool(self.asleep[i])
+        snap['time_dark'] = int(self.time_dark[i])
+        snap['time'] = self.time
+        return snap
+
+
+def snapshot(state):
+    snap = {name: getattr(state, name).value for name in PROPERTIES}
+    snap['alive'] = state.alive
+    snap['asleep'] = state.asleep
+    snap['time_dark'] = state.fatigue.time_dark
+    snap['time'] = state.time
+    return snap
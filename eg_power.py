@@ -0,0 +1,85 @@
+import utime
+import machine
+
+class PowerManager:
+    def __init__(self, creature, wake_pins, coarse_ticks=10, panel_off=False, dim_contrast=1, render_every=5):
+        # While the creature sleeps: lightsleep coarse_ticks at a time, wake
+        # early on a rising edge of wake_pins, and catch State up afterwards.
+        self.creature = creature
+        self.wake_pins = wake_pins
+        self.coarse_ticks = coarse_ticks
+        self.panel_off = panel_off  # otherwise dim to dim_contrast
+        self.dim_contrast = dim_contrast
+        self.render_every = render_every  # coarse ticks per frame when dimmed
+        self.step_ms = int(creature.state.timestep * 1000)
+        self.dozing = False
+        self.woken = None
+        self.carry_ms = 0
+        self.dozes = 0
+        self.last = 0
+
+    def wake(self, pin):
+        self.woken = pin
+
+    def enter(self):
+        self.dozing = True
+        oled = self.creature.dp.oled
+        if self.panel_off:
+            oled.poweroff()
+        else:
+            oled.contrast(self.dim_contrast)
+        for led in self.creature.nose.rgb_led:
+            # Through set_level, so its duty cache knows the LED is off
+            led.set_level(0)
+        for pin in self.wake_pins:
+            pin.irq(trigger=machine.Pin.IRQ_RISING, handler=self.wake)
+        self.carry_ms = 0
+        self.last = utime.ticks_ms()
+
+    def exit(self):
+        self.dozing = False
+        for pin in self.wake_pins:
+            pin.irq(handler=None)
+        oled = self.creature.dp.oled
+        if self.panel_off:
+            oled.poweron()
+        else:
+            oled.contrast(0xFF)
+        nose = self.creature.nose
+        if nose.deps is not None:
+            # Turned off behind change tracking's back
+            nose.deps.invalidate()
+
+    def doze(self):
+        creature = self.creature
+        state = creature.state
+        if not self.dozing:
+            self.enter()
+        self.woken = None
+        machine.lightsleep(self.coarse_ticks * self.step_ms)
+
+        # Catch up on the ticks slept. Inputs are only known now, so the
+        # missed ticks run with the inputs from before and the last one
+        # with what the sensors (or the wake pin) report on waking.
+        now = utime.ticks_ms()
+        elapsed = utime.ticks_diff(now, self.last) + self.carry_ms
+        self.last = now
+        ticks = elapsed // self.step_ms
+        self.carry_ms = elapsed - ticks * self.step_ms
+        if ticks:
+            state.advance(ticks - 1)
+            creature.light_sensor.update(state)
+            creature.ear.update(state)
+            if self.woken is creature.ear.sound_detector:
+                state.env.sound = True
+            state.update()
+        key = creature.kb.read()
+        creature.handle_key(key)
+        if creature.recorder:
+            creature.recorder.record_doze(ticks, state.env, key)
+
+        self.dozes += 1
+        if not state.asleep or not state.alive:
+            self.exit()
+        elif not self.panel_off and self.dozes % self.render_every == 0:
+            creature.dp.render(state)
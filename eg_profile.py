@@ -0,0 +1,97 @@
+import gc
+import utime
+
+class StageStats:
+    def __init__(self, name, buckets):
+        self.name = name
+        self.buckets = buckets
+        self.histogram = [0] * (len(buckets) + 1)  # last bucket is overflow
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+        for i in range(len(self.histogram)):
+            self.histogram[i] = 0
+
+    def add(self, us):
+        if self.count == 0 or us < self.min:
+            self.min = us
+        if us > self.max:
+            self.max = us
+        self.count += 1
+        self.total += us
+        i = 0
+        while i < len(self.buckets) and us >= self.buckets[i]:
+            i += 1
+        self.histogram[i] += 1
+
+    def avg(self):
+        return self.total // self.count if self.count else 0
+
+
+class TickProfiler:
+    def __init__(self, stages, timestep, report_every=10, buckets=(100, 500, 1000, 5000, 10000, 50000)):
+        # Bucket bounds in us, report_every in seconds
+        self.stages = [StageStats(name, buckets) for name in stages]
+        self.work = StageStats('tick', buckets)
+        self.budget_us = int(timestep * 1000000)
+        self.report_every = report_every * 1000
+        # gc.mem_free is MicroPython only
+        self.mem_free = getattr(gc, 'mem_free', None)
+        self.reset()
+        self.last_report = utime.ticks_ms()
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+        self.work.reset()
+        self.ticks = 0
+        self.overruns = 0
+        self.mem_min = 0
+        self.mem_max = 0
+        self.mem_total = 0
+
+    def start(self):
+        self.tick_start = utime.ticks_us()
+        self.last = self.tick_start
+        if self.mem_free:
+            self.mem_start = self.mem_free()
+
+    def mark(self, stage):
+        # Time since the previous mark goes to stage (index into stages)
+        now = utime.ticks_us()
+        self.stages[stage].add(utime.ticks_diff(now, self.last))
+        self.last = now
+
+    def end(self):
+        work = utime.ticks_diff(self.last, self.tick_start)
+        self.work.add(work)
+        if work > self.budget_us:
+            self.overruns += 1
+        if self.mem_free:
+            # Negative when the tick allocated (or positive after a collect)
+            delta = self.mem_free() - self.mem_start
+            if self.ticks == 0 or delta < self.mem_min:
+                self.mem_min = delta
+            if self.ticks == 0 or delta > self.mem_max:
+                self.mem_max = delta
+            self.mem_total += delta
+        self.ticks += 1
+        if utime.ticks_diff(utime.ticks_ms(), self.last_report) >= self.report_every:
+            self.report()
+            self.reset()
+            self.last_report = utime.ticks_ms()
+
+    def report(self):
+        print('ticks %d, overruns %d (budget %dus)' % (self.ticks, self.overruns, self.budget_us))
+        print('%-10s %8s %8s %8s  histogram <%s,inf us' %
+              ('stage', 'min', 'avg', 'max', ','.join(str(b) for b in self.work.buckets)))
+        for stage in self.stages + [self.work]:
+            print('%-10s %8d %8d %8d  %s' % (stage.name, stage.min, stage.avg(), stage.max,
+                                             ' '.join(str(n) for n in stage.histogram)))
+        if self.mem_free and self.ticks:
+            print('mem_free delta min %d avg %d max %d, free %d' %
+                  (self.mem_min, self.mem_total // self.ticks, self.mem_max, self.mem_free()))
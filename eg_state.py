@@ -16,29 +16,44 @@ class StateProperty:
         # this means L*seconds s to run down an entire range.
         self.timebase = timebase
         self.manual_update = manual_update
+        self.version = 0  # bumped on every change of value, see Dependencies
 
     def input_update(self, v):
         if self.manual_update:
             self.add(v)
 
     def add(self, inc):
-        self.value = self.value + inc
-        if self.value >= self.max:
+        value = self.value + inc
+        ok = True
+        if value >= self.max:
             if self.wrap:
-                self.value = 0
+                value = 0
             else:
-                self.value = self.max
-            return False
-        elif self.value < 0:
-            self.value = 0
-            return False
-        return True
+                value = self.max
+            ok = False
+        elif value < 0:
+            value = 0
+            ok = False
+        if value != self.value:
+            self.value = value
+            self.version += 1
+        return ok
+
+    def add_repeated(self, inc, count):
+        # Same as count calls to add(inc), in closed form when not wrapping
+        if self.wrap:
+            for _ in range(count):
+                self.add(inc)
+        elif count > 0:
+            self.set(min(max(self.value + inc*count, 0), self.max))
 
     def set(self, v):
-        self.value = v
+        if v != self.value:
+            self.value = v
+            self.version += 1
 
     def scaled_value(self, scale):
-        return int(scale*(self.value/self.max))
+        return scale * self.value // self.max
 
     def update_event(self, time):
         return (time % self.timebase) == 0
@@ -146,9 +161,60 @@ class StateFatigue(StateProperty):
 
 class Environment:
     def __init__(self):
-        self.dark = False
-        self.sound = False
+        self.version = 0  # bumped when dark or sound change
+        self._dark = False
+        self._sound = False
         self.generating_sound = False
+        self.sound_end = 0  # ticks_ms when we last stopped making sound
+        self.sound_intensity = 0  # 0-100, only with a counting Ear
+
+    @property
+    def dark(self):
+        return self._dark
+
+    @dark.setter
+    def dark(self, v):
+        if v != self._dark:
+            self._dark = v
+            self.version += 1
+
+    @property
+    def sound(self):
+        return self._sound
+
+    @sound.setter
+    def sound(self, v):
+        if v != self._sound:
+            self._sound = v
+            self.version += 1
+
+class Dependencies:
+    def __init__(self, sources):
+        # sources: anything with a version counter (StateProperty, State,
+        # Environment, or a device's own version)
+        self.sources = sources
+        self.seen = [-1] * len(sources)
+        self.runs = 0
+        self.skips = 0
+
+    def changed(self):
+        # True (and remember the versions) if any source changed since last call
+        changed = False
+        for i in range(len(self.sources)):
+            version = self.sources[i].version
+            if version != self.seen[i]:
+                self.seen[i] = version
+                changed = True
+        if changed:
+            self.runs += 1
+        else:
+            self.skips += 1
+        return changed
+
+    def invalidate(self):
+        # Force the next changed() to report a change
+        for i in range(len(self.seen)):
+            self.seen[i] = -1
 
 class State:
     def __init__(self):
@@ -165,12 +231,54 @@ class State:
                         'arousal': self.get_arousal,
                         'fatigue': self.get_fatigue}
         self.header = StateProperty(self,0,len(self.headers), True)
-        self.alive = True
-        self.asleep = False
+        self.header_names = sorted(self.headers)  # header.value indexes this
+        self.properties = [self.age, self.energy, self.happiness,
+                           self.arousal, self.attention, self.fatigue]
+        self.version = 0  # bumped when alive or asleep change
+        self._alive = True
+        self._asleep = False
+        self.dependencies = {}
         self.env = Environment()
         self.time = 0
         self.timestep = .1
 
+    @property
+    def alive(self):
+        return self._alive
+
+    @alive.setter
+    def alive(self, v):
+        if v != self._alive:
+            self._alive = v
+            self.version += 1
+
+    @property
+    def asleep(self):
+        return self._asleep
+
+    @asleep.setter
+    def asleep(self, v):
+        if v != self._asleep:
+            self._asleep = v
+            self.version += 1
+
+    def depends(self, name, sources):
+        # Register a consumer that only needs to recompute when sources change
+        deps = Dependencies(sources)
+        self.dependencies[name] = deps
+        return deps
+
+    def recomputes(self):
+        # Recomputations run by all consumers so far
+        n = 0
+        for name in self.dependencies:
+            n += self.dependencies[name].runs
+        return n
+
+    def change_stats(self):
+        # Recomputations run and avoided per consumer
+        return dict((name, (deps.runs, deps.skips)) for name, deps in self.dependencies.items())
+
     def update(self):
         self.age.update()
         self.energy.update()
@@ -180,6 +288,36 @@ class State:
         self.fatigue.update()
         self.time = self.time + 1
 
+    def next_event(self):
+        # First tick from now where any property has an update_event
+        t = self.time
+        return min(t + (-t) % p.timebase for p in self.properties)
+
+    def advance(self, n):
+        # Same as n calls to update() with a constant env, but ticks between
+        # update events are applied in closed form.
+        end = self.time + n
+        while self.time < end:
+            quiet = min(self.next_event(), end) - self.time
+            # A full update settles asleep/arousal, after that quiet ticks
+            # only add sound input.
+            self.update()
+            if quiet > 1:
+                self.skip_quiet(quiet - 1)
+
+    def skip_quiet(self, ticks):
+        if self.env.sound:
+            self.attention.add_repeated(3, ticks)
+            self.arousal.add_repeated(3, ticks)
+        self.time = self.time + ticks
+
+    def press(self, key):
+        # Button input: 0 feeds the current header, 1 switches to the next
+        if key == 0:
+            self.header_property().input_update(5)
+        elif key == 1:
+            _ = self.header.add(1)
+
     def get_age(self):
         return self.age
     def get_energy(self):
@@ -194,5 +332,11 @@ class State:
         return self.fatigue
 
     def get_header(self):
-        hdr = sorted(list(self.headers.keys()))[self.header.value]
+        hdr = self.header_names[self.header.value]
         return hdr, self.headers[hdr]
+
+    def header_name(self):
+        return self.header_names[self.header.value]
+
+    def header_property(self):
+        return self.headers[self.header_names[self.header.value]]()
@@ -0,0 +1,103 @@
+import struct
+import utime
+from binascii import crc32
+
+# seq, time, the six properties (State.properties order), header, flags,
+# fatigue time_dark and time_to_falling_asleep; a crc32 of all that follows.
+RECORD = '<II6HBBHH'
+RECORD_SIZE = struct.calcsize(RECORD)
+SLOT_SIZE = RECORD_SIZE + 4
+TIME_END = 8  # the payload after this is what counts as a change
+ALIVE = 1
+ASLEEP = 2
+
+def pack_state(buf, offset, seq, state):
+    p = state.properties
+    flags = (ALIVE if state.alive else 0) | (ASLEEP if state.asleep else 0)
+    struct.pack_into(RECORD, buf, offset, seq, state.time,
+                     p[0].value, p[1].value, p[2].value, p[3].value, p[4].value, p[5].value,
+                     state.header.value, flags,
+                     state.fatigue.time_dark, state.fatigue.time_to_falling_asleep)
+
+def restore_state(state, record):
+    # record: a RECORD unpacked by struct
+    state.time = record[1]
+    for i in range(6):
+        state.properties[i].set(record[2 + i])
+    state.header.set(record[8])
+    state.alive = bool(record[9] & ALIVE)
+    state.asleep = bool(record[9] & ASLEEP)
+    state.fatigue.time_dark = record[10]
+    state.fatigue.time_to_falling_asleep = record[11]
+
+class StateStore:
+    def __init__(self, prefix='state', slots=4, min_interval=60):
+        # Snapshots rotate over slots files prefix0.bin.. so a torn write
+        # only loses the newest one. min_interval in seconds between writes.
+        self.names = [prefix + str(i) + '.bin' for i in range(slots)]
+        self.min_interval = min_interval * 1000
+        self.buf = bytearray(SLOT_SIZE)
+        self.last = bytearray(RECORD_SIZE - TIME_END)
+        self.seq = 0
+        self.slot = 0
+        self.written = utime.ticks_ms()
+        self.writes = 0
+        self.skipped = 0
+
+    def pack(self, state):
+        pack_state(self.buf, 0, self.seq, state)
+
+    def read(self, name):
+        # The record in a slot file, None if missing, short or corrupt
+        try:
+            with open(name, 'rb') as f:
+                n = f.readinto(self.buf)
+        except OSError:
+            return None
+        if n != SLOT_SIZE:
+            return None
+        crc = struct.unpack_from('<I', self.buf, RECORD_SIZE)[0]
+        if crc32(memoryview(self.buf)[:RECORD_SIZE]) != crc:
+            return None
+        return struct.unpack_from(RECORD, self.buf, 0)
+
+    def load(self, state):
+        # Restore the newest valid snapshot, True if there was one to resume
+        best = None
+        for i in range(len(self.names)):
+            record = self.read(self.names[i])
+            if record is not None and (best is None or record[0] > best[0]):
+                best = record
+                self.slot = (i + 1) % len(self.names)
+        if best is None:
+            return False
+        self.seq = best[0] + 1
+        if not best[9] & ALIVE:
+            # Died last time, start over (new snapshots go after this one)
+            return False
+        restore_state(state, best)
+        self.pack(state)
+        self.last = self.buf[TIME_END:RECORD_SIZE]
+        return True
+
+    def save(self, state, force=False):
+        # Write a snapshot if anything besides time changed, at most every
+        # min_interval unless forced. True if written.
+        now = utime.ticks_ms()
+        if not force and utime.ticks_diff(now, self.written) < self.min_interval:
+            return False
+        self.pack(state)
+        payload = self.buf[TIME_END:RECORD_SIZE]
+        if not force and payload == self.last:
+            self.skipped += 1
+            self.written = now
+            return False
+        struct.pack_into('<I', self.buf, RECORD_SIZE, crc32(memoryview(self.buf)[:RECORD_SIZE]))
+        with open(self.names[self.slot], 'wb') as f:
+            f.write(self.buf)
+        self.last = payload
+        self.slot = (self.slot + 1) % len(self.names)
+        self.seq += 1
+        self.written = now
+        self.writes += 1
+        return True
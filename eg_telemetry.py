@@ -0,0 +1,202 @@
+import struct
+import utime
+from binascii import hexlify
+
+# tick, the six properties (State.properties order: age is the only one
+# above 255), flags: asleep 1, dark 2, sound 4, mood code << 3
+RECORD = '<IH6B'
+RECORD_SIZE = struct.calcsize(RECORD)
+FIELDS = 8
+ASLEEP = 1
+DARK = 2
+SOUND = 4
+MOODS = ('angry', 'joy', 'content', 'depressed')
+MOOD_CODES = {'angry': 0, 'joy': 1, 'content': 2, 'depressed': 3}
+# Start of a flushed block: record count, first record as is, then runs of
+# identical deltas (see Telemetry.encode and host/telemetry.py)
+MAGIC = 0xE7
+TEXT_PREFIX = 'TLM '
+# Longest (run, delta) entry: run and mask, tick, age, five one byte fields
+MAX_ENTRY = 3 + 1 + 5 + 3 + 5 * 2
+
+def put_varint(out, i, v):
+    # Write v at out[i], return the index after it
+    while v > 0x7F:
+        out[i] = 0x80 | (v & 0x7F)
+        v >>= 7
+        i += 1
+    out[i] = v
+    return i + 1
+
+def zigzag(v):
+    return v << 1 if v >= 0 else (-v << 1) - 1
+
+class Telemetry:
+    def __init__(self, path=None, capacity=256, flush_every=60, batch=8, buffer_size=256):
+        # Records go to a ring in RAM, only on ticks where something besides
+        # the tick changed. step() appends them, delta and run-length
+        # encoded, to the file path, or prints them as hex lines on the
+        # serial console when path is None. flush_every in seconds.
+        # A flush is spread over ticks: step() encodes batch records, or
+        # writes out buffer_size encoded bytes, never both.
+        self.path = path
+        self.capacity = capacity
+        self.slots = capacity + 1  # the head slot is always free for sample()
+        self.buf = bytearray(RECORD_SIZE * self.slots)
+        self.head = 0
+        self.count = 0  # records not encoded yet
+        self.lost = 0  # overwritten or dropped before a flush
+        self.primed = False
+        self.flush_every = flush_every * 1000
+        self.flushed = utime.ticks_ms()
+        self.batch = batch
+        self.buffer_size = buffer_size
+        self.out = bytearray(buffer_size + MAX_ENTRY + RECORD_SIZE)
+        self.used = 0
+        self.left = 0  # records of the block being encoded
+        self.prev = [0] * FIELDS
+        self.delta = bytearray(MAX_ENTRY)
+        self.pending = bytearray(MAX_ENTRY)
+        self.pending_len = 0
+        self.run = 0
+
+    def sample(self, state, mood):
+        off = self.head * RECORD_SIZE
+        p = state.properties
+        env = state.env
+        flags = ((ASLEEP if state.asleep else 0) | (DARK if env.dark else 0) |
+                 (SOUND if env.sound else 0) | MOOD_CODES.get(mood, 0) << 3)
+        struct.pack_into(RECORD, self.buf, off, state.time,
+                         p[0].value, p[1].value, p[2].value, p[3].value, p[4].value, p[5].value,
+                         flags)
+        if self.primed:
+            buf = self.buf
+            prev = (off or len(buf)) - RECORD_SIZE
+            for i in range(4, RECORD_SIZE):
+                if buf[off + i] != buf[prev + i]:
+                    break
+            else:
+                return False
+        if self.count == self.capacity and self.left:
+            # The oldest records belong to the block being encoded
+            self.lost += 1
+            return False
+        self.primed = True
+        self.head = (self.head + 1) % self.slots
+        if self.count == self.capacity:
+            self.lost += 1
+        else:
+            self.count += 1
+        return True
+
+    def due(self):
+        return self.count and (self.count >= self.capacity // 2 or
+                               utime.ticks_diff(utime.ticks_ms(), self.flushed) >= self.flush_every)
+
+    def field(self, off, i):
+        # Field i of the record at off, without unpacking a tuple
+        buf = self.buf
+        if i == 0:
+            return buf[off] | buf[off + 1] << 8 | buf[off + 2] << 16 | buf[off + 3] << 24
+        if i == 1:
+            return buf[off + 4] | buf[off + 5] << 8
+        return buf[off + 4 + i]
+
+    def pop(self):
+        # Offset of the oldest record not encoded yet
+        off = (self.head - self.count) % self.slots * RECORD_SIZE
+        self.count -= 1
+        self.left -= 1
+        return off
+
+    def begin(self):
+        # A block is MAGIC, record count, the first record as is, then
+        # (run, delta) entries: delta is a field mask and zigzag varints of
+        # the changed fields, applied run times.
+        out = self.out
+        self.left = self.count
+        out[self.used] = MAGIC
+        self.used = put_varint(out, self.used + 1, self.count)
+        off = self.pop()
+        for i in range(RECORD_SIZE):
+            out[self.used + i] = self.buf[off + i]
+        self.used += RECORD_SIZE
+        for i in range(FIELDS):
+            self.prev[i] = self.field(off, i)
+        self.pending_len = 0
+        self.run = 0
+
+    def encode(self, n):
+        # Encode up to n more records of the block
+        prev = self.prev
+        delta = self.delta
+        pending = self.pending
+        while n and self.left:
+            n -= 1
+            off = self.pop()
+            mask = 0
+            k = 1
+            for i in range(FIELDS):
+                v = self.field(off, i)
+                if v != prev[i]:
+                    mask |= 1 << i
+                    k = put_varint(delta, k, zigzag(v - prev[i]))
+                    prev[i] = v
+            delta[0] = mask
+            if k == self.pending_len:
+                for i in range(k):
+                    if delta[i] != pending[i]:
+                        break
+                else:
+                    self.run += 1
+                    continue
+            self.put_pending()
+            for i in range(k):
+                pending[i] = delta[i]
+            self.pending_len = k
+            self.run = 1
+        if not self.left:
+            self.put_pending()
+
+    def put_pending(self):
+        if self.run:
+            out = self.out
+            self.used = put_varint(out, self.used, self.run)
+            for i in range(self.pending_len):
+                out[self.used + i] = self.pending[i]
+            self.used += self.pending_len
+            self.run = 0
+
+    def write(self):
+        block = memoryview(self.out)[:self.used]
+        if self.path is None:
+            print(TEXT_PREFIX + hexlify(block).decode())
+        else:
+            with open(self.path, 'ab') as f:
+                f.write(block)
+        self.used = 0
+
+    def step(self):
+        # One tick's share of a flush, True while one is in progress
+        if self.used >= self.buffer_size or (self.used and not self.left):
+            self.write()
+            if not self.left:
+                self.flushed = utime.ticks_ms()
+        elif self.left:
+            self.encode(self.batch)
+        elif self.due():
+            self.begin()
+            self.encode(self.batch)
+        return bool(self.left or self.used)
+
+    def flush(self):
+        # Encode and write everything now
+        if self.count and not self.left:
+            self.begin()
+        while self.left:
+            if self.used >= self.buffer_size:
+                self.write()
+            self.encode(self.batch)
+        if self.used:
+            self.write()
+        self.flushed = utime.ticks_ms()
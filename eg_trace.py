@@ -0,0 +1,156 @@
+import struct
+from binascii import crc32
+from eg_store import RECORD, RECORD_SIZE, pack_state, restore_state
+
+# A trace is MAGIC, the State it started from (an eg_store record), then
+# (varint run, inputs) pairs: the inputs of run consecutive live() loops.
+# inputs: dark 1, sound 2, (key + 1) << 2, (state ticks run - 1) << 4
+# A run of 0 is a PowerManager.doze() instead: (0, varint ticks, inputs).
+MAGIC = b'OGT1'
+DARK = 1
+SOUND = 2
+
+def encode_inputs(due, env, key):
+    return ((DARK if env.dark else 0) | (SOUND if env.sound else 0) |
+            (0 if key is None else key + 1) << 2 | (due - 1) << 4)
+
+def decode_inputs(inputs):
+    # (due, dark, sound, key)
+    key = (inputs >> 2) & 3
+    return ((inputs >> 4) + 1, bool(inputs & DARK), bool(inputs & SOUND),
+            key - 1 if key else None)
+
+class TraceRecorder:
+    def __init__(self, path, state, buffer_size=256):
+        # Run-length encoded in RAM, appended to path every buffer_size bytes
+        self.path = path
+        self.buffer_size = buffer_size
+        self.out = bytearray(buffer_size + 12)  # room for one more entry
+        self.used = 0
+        self.inputs = -1
+        self.run = 0
+        self.loops = 0
+        header = bytearray(len(MAGIC) + RECORD_SIZE)
+        header[:len(MAGIC)] = MAGIC
+        pack_state(header, len(MAGIC), 0, state)
+        with open(path, 'wb') as f:
+            f.write(header)
+
+    def record(self, due, env, key):
+        # Inputs of one live() loop: ticks run, env after the sensors, key read
+        self.loops += 1
+        inputs = encode_inputs(due, env, key)
+        if inputs == self.inputs:
+            self.run += 1
+            return
+        if self.run:
+            self.put(self.run, self.inputs)
+        self.inputs = inputs
+        self.run = 1
+
+    def record_doze(self, ticks, env, key):
+        # A doze: ticks caught up, env on waking, key read
+        self.loops += 1
+        if self.run:
+            self.put(self.run, self.inputs)
+            self.run = 0
+            self.inputs = -1
+        self.put_varint(0)
+        self.put(ticks, encode_inputs(1, env, key))
+
+    def put_varint(self, v):
+        out = self.out
+        i = self.used
+        while v > 0x7F:
+            out[i] = 0x80 | (v & 0x7F)
+            v >>= 7
+            i += 1
+        out[i] = v
+        self.used = i + 1
+
+    def put(self, run, inputs):
+        self.put_varint(run)
+        self.out[self.used] = inputs
+        self.used += 1
+        if self.used >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.used:
+            with open(self.path, 'ab') as f:
+                f.write(memoryview(self.out)[:self.used])
+            self.used = 0
+
+    def close(self):
+        if self.run:
+            self.put(self.run, self.inputs)
+            self.run = 0
+            self.inputs = -1
+        self.flush()
+
+def get_varint(data, pos):
+    # (value, position after it), None at a torn end
+    v = 0
+    shift = 0
+    while pos < len(data):
+        b = data[pos]
+        pos += 1
+        v |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return v, pos
+        shift += 7
+    return None, pos
+
+def read_trace(path):
+    # (initial State record, [(run, inputs, ticks)]), ticks only for dozes
+    # (run 0). A torn last entry is ignored.
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('not a trace: ' + path)
+    record = struct.unpack_from(RECORD, data, len(MAGIC))
+    pos = len(MAGIC) + RECORD_SIZE
+    runs = []
+    while pos < len(data):
+        run, pos = get_varint(data, pos)
+        ticks = 0
+        if run == 0:
+            ticks, pos = get_varint(data, pos)
+        if run is None or ticks is None or pos >= len(data):
+            break
+        runs.append((run, data[pos], ticks))
+        pos += 1
+    return record, runs
+
+def replay(state, record, runs, devices=None):
+    # Feed a trace back into state as fast as possible. devices() is called
+    # where live() updates the devices; without it, runs of unchanged inputs
+    # go through State.advance.
+    restore_state(state, record)
+    for run, inputs, ticks in runs:
+        due, dark, sound, key = decode_inputs(inputs)
+        if run == 0:
+            # Same order as PowerManager.doze
+            if ticks:
+                state.advance(ticks - 1)
+                state.env.dark = dark
+                state.env.sound = sound
+                state.update()
+            state.press(key)
+            continue
+        loops = run if devices is not None or key is not None else 1
+        for _ in range(loops):
+            for _ in range(due):
+                state.update()
+            if devices is not None:
+                devices()
+            state.env.dark = dark
+            state.env.sound = sound
+            state.press(key)
+        if loops < run:
+            state.advance((run - 1) * due)
+
+def state_hash(state):
+    buf = bytearray(RECORD_SIZE)
+    pack_state(buf, 0, 0, state)
+    return crc32(buf)
@@ -3,28 +3,125 @@ import math
 import utime
 import random
 import machine
+import micropython
+from array import array
 from ssd1306 import SSD1306_I2C
 
 TIMESTEP = 0.1
 
+# Keyboard events, packed with the button index as (event << 4) | button
+KEY_PRESS = 1
+KEY_RELEASE = 2
+KEY_LONG_PRESS = 3
+
+# One-character strings for drawing numbers without str(), see Header
+DIGITS = tuple(str(i) for i in range(10))
+
 class Frame:
-    def __init__(self, width, height):
+    def __init__(self, width, height, buffer=None, stride=None, x=0):
         self.height = height
         self.width = width
-        self.pos = [0, 0] # [x, y]
-        self.fb = framebuf.FrameBuffer(bytearray(int(height*width/8)), width, height, framebuf.MONO_HLSB)
+        self.x = x  # first column of the frame in a shared buffer
+        self.pos = [x, 0] # [x, y]
+        self.stride = stride
+        if buffer is None:
+            self.buffer = bytearray(int(height*width/8))
+            self.fb = framebuf.FrameBuffer(self.buffer, width, height, framebuf.MONO_HLSB)
+        else:
+            # View of whole page rows of a larger MONO_VLSB buffer (the
+            # OLED's), rows of stride bytes; the frame is columns x.. of it.
+            # A view starting at column x would be too short for framebuf.
+            self.buffer = buffer
+            self.fb = framebuf.FrameBuffer(buffer, x + width, height, framebuf.MONO_VLSB, stride)
+        self.deps = None  # set by track(), see eg_state.Dependencies
+        self.changed = True  # redrawn since Display last showed it
 
-    def random_event(self, chance):
-        return random.random() < chance
+    def unchanged(self):
+        # With change tracking, True when none of the frame's inputs changed
+        if self.deps is None or self.deps.changed():
+            self.changed = True
+            return False
+        return True
+
+    def random_interval(self, chance):
+        # Ticks until the next success of a per-tick chance (geometric), one
+        # draw instead of a random() < chance test on every tick in between
+        if chance >= 1:
+            return 1
+        if chance <= 0:
+            return 1 << 30
+        return 1 + int(math.log(1.0 - random.random()) / math.log(1.0 - chance))
 
     def clear(self):
-        self.fb.fill(0)
+        if self.x:
+            self.fb.fill_rect(self.x, 0, self.width, self.height, 0)
+        else:
+            self.fb.fill(0)
+
+    def snapshot(self):
+        # Frame contents without the rest of a shared buffer
+        if self.stride is None:
+            return self.buffer
+        out = bytearray(self.width * (self.height // 8))
+        for page in range(self.height // 8):
+            start = page*self.stride + self.x
+            out[page*self.width:(page + 1)*self.width] = self.buffer[start:start + self.width]
+        return out
+
+    def restore(self, data):
+        if self.stride is None:
+            self.buffer[:] = data
+            return
+        for page in range(self.height // 8):
+            start = page*self.stride + self.x
+            self.buffer[start:start + self.width] = data[page*self.width:(page + 1)*self.width]
+
+
+class SpriteCache:
+    def __init__(self, budget):
+        self.budget = budget  # bytes
+        self.sprites = {}
+        self.order = []  # least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.order[-1] != key:
+            self.order.remove(key)
+            self.order.append(key)
+        return sprite
+
+    def put(self, key, buf):
+        if len(buf) > self.budget:
+            return
+        while self.size + len(buf) > self.budget:
+            # Evict least recently used
+            old = self.order.pop(0)
+            self.size -= len(self.sprites.pop(old))
+            self.evictions += 1
+        self.sprites[key] = bytearray(buf)
+        self.order.append(key)
+        self.size += len(buf)
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'sprites': len(self.sprites),
+                'bytes': self.size}
 
 
 class Eyes(Frame):
-    def __init__(self, width, height):
-        super().__init__(width, height)
-        self.pos = [50, 30]  # [x, y]
+    def __init__(self, width, height, buffer=None, stride=None, x=0):
+        super().__init__(width, height, buffer, stride, x)
+        self.pos = [self.x + 50, 30]  # [x, y]
         self.eye_radius_x = 20
         self.eye_radius_y = 20
         self.eyebrow_angle = 0 # 0 is flat, 10 is sad angle, -10 is angry angle
@@ -38,6 +135,13 @@ class Eyes(Frame):
         self.blink_rate = 0.03  # % chance of blink
         self.gaze_rate = 0.05  # % chance of blink
         self.blink_duration = 1  # render intervals
+        # Open ticks until the next blink / gaze change. Redrawn on the tick
+        # the event fires, which redraws the eyes anyway: quiet ticks only
+        # count down (no float math, see main.Ogreenes zero_alloc).
+        self.blink_in = self.random_interval(self.blink_rate)
+        self.gaze_in = self.random_interval(self.gaze_rate)
+        self.sprite_cache = None
+        self.version = 0  # bumped when blinking or gaze change the picture
         self.render_eyes(1)
         self.render_eyebrows(1)
         self.render_pupils(1)
@@ -103,17 +207,21 @@ class Eyes(Frame):
                      self.pos[1] + self.dead_eye_size,
                      draw)
 
+    def pupil_offset(self):
+        return (int(math.sin(self.gaze_direction) * self.eye_radius_x / 2),
+                int(math.cos(self.gaze_direction) * self.eye_radius_y / 2))
+
     def render_pupils(self, draw):
-        self.fb.ellipse(self.pos[0] + int(math.sin(self.gaze_direction) * self.eye_radius_x / 2),
-                        self.pos[1] + int(math.cos(self.gaze_direction) * self.eye_radius_y / 2),
+        dx, dy = self.pupil_offset()
+        self.fb.ellipse(self.pos[0] + dx,
+                        self.pos[1] + dy,
                         self.pupil_radius,
                         self.pupil_radius,
                         draw,
                         True)
         # right pupil
-        self.fb.ellipse(self.pos[0] + self.eye_distance
-                        + int(math.sin(self.gaze_direction) * self.eye_radius_x / 2),
-                        self.pos[1] + int(math.cos(self.gaze_direction) * self.eye_radius_y / 2),
+        self.fb.ellipse(self.pos[0] + self.eye_distance + dx,
+                        self.pos[1] + dy,
                         self.pupil_radius,
                         self.pupil_radius,
                         draw,
@@ -122,9 +230,24 @@ class Eyes(Frame):
     def blink(self):
         self.eyes_state = 'blink'
         self.blink_count = 0
+        self.version += 1
+
+    def track(self, state):
+        self.deps = state.depends('eyes', [state, state.happiness, state.arousal, self])
+
+    def enable_sprite_cache(self, budget=8192):
+        # Memoize rendered eyes, budget in bytes (one sprite is one frame buffer)
+        self.sprite_cache = SpriteCache(budget)
+
+    def sprite_key(self):
+        if self.eyes_state == 'open':
+            dx, dy = self.pupil_offset()
+            return (self.eyes_state, self.eye_radius_y, self.eyebrow_angle, dx, dy)
+        return (self.eyes_state,)
 
     def update_frame(self, state):
-        self.clear()
+        if self.unchanged():
+            return
         if not state.alive:
             self.eyes_state = 'dead'
         if state.asleep:
@@ -137,6 +260,21 @@ class Eyes(Frame):
         else:
             self.eyebrow_angle = 1
 
+        if self.eyes_state == 'sleep' and not state.asleep:
+            # Woke up, blank for this frame and open from the next one
+            self.eyes_state = 'open'
+            self.version += 1
+            self.clear()
+            return
+
+        if self.sprite_cache is not None:
+            key = self.sprite_key()
+            sprite = self.sprite_cache.get(key)
+            if sprite is not None:
+                self.restore(sprite)
+                return
+
+        self.clear()
         if self.eyes_state == 'open':
             self.render_eyes(1)
             self.render_eyebrows(1)
@@ -144,13 +282,13 @@ class Eyes(Frame):
         elif self.eyes_state == 'blink':
             self.render_sleep(1)
         elif self.eyes_state == 'sleep':
-            if not state.asleep:
-                self.eyes_state = 'open'
-            else:
-                self.render_sleep(1)
+            self.render_sleep(1)
         elif self.eyes_state == 'dead':
             self.render_dead(1)
 
+        if self.sprite_cache is not None:
+            self.sprite_cache.put(key, self.snapshot())
+
     def autonomous_events(self):
         update = False
         if self.eyes_state == 'blink':
@@ -159,39 +297,124 @@ class Eyes(Frame):
                 self.eyes_state = 'open'
                 update = True
         elif self.eyes_state == 'open':
-            if self.random_event(self.blink_rate):
+            self.blink_in -= 1
+            self.gaze_in -= 1
+            if not self.blink_in:
                 self.blink()
+                self.blink_in = self.random_interval(self.blink_rate)
                 update = True
-            if self.random_event(self.gaze_rate):
+            if not self.gaze_in:
                 self.gaze_direction = random.random() * 6
+                self.gaze_in = self.random_interval(self.gaze_rate)
                 update = True
-        #if update:
-        #    self.update_frame()
+        if update:
+            self.version += 1
 
 
 class Header(Frame):
-    def __init__(self, width, height):
-        super().__init__(width,height)
+    def __init__(self, width, height, buffer=None, stride=None, x=0):
+        super().__init__(width, height, buffer, stride, x)
         self.text = 'Ogreenes'
         self.value = 0
+        self.labels = None  # see preallocate()
+        self.glyphs = None  # see enable_glyph_cache()
         self.render_text(1)
 
+    def preallocate(self, state):
+        # Label strings built once, values drawn digit by digit
+        self.labels = dict((name, name + ': ') for name in state.header_names)
+
+    def enable_glyph_cache(self, state):
+        # Labels and digits rendered once, update_frame then blits the label
+        # on a header switch and only the digits that changed
+        fmt = framebuf.MONO_HLSB if self.stride is None else framebuf.MONO_VLSB
+        self.glyphs = {}
+        for name in state.header_names:
+            self.glyphs[name] = (self.glyph(name + ': ', fmt), 8 * len(name + ': '))
+        self.digit_glyphs = [self.glyph(d, fmt) for d in DIGITS]
+        self.digits = bytearray(10)  # value being drawn, least significant first
+        self.shown = bytearray(10)  # digits on screen, most significant first
+        self.shown_count = 0
+
+    def glyph(self, text, fmt):
+        # 8 rows of text in the header's own format, so blits are plain copies
+        fb = framebuf.FrameBuffer(bytearray(8 * len(text)), 8 * len(text), 8, fmt)
+        fb.text(text, 0, 0, 1)
+        return fb
+
+    def update_glyphs(self, state):
+        if self.deps is not None and not self.deps.changed():
+            return
+        name = state.header_name()
+        value = state.header_property().value
+        if name == self.text and value == self.value:
+            return
+        count = 0
+        v = value
+        while True:
+            self.digits[count] = v % 10
+            count += 1
+            v //= 10
+            if not v:
+                break
+        label, width = self.glyphs[name]
+        x = self.pos[0] + width
+        if name != self.text:
+            self.clear()
+            self.fb.blit(label, self.pos[0], self.pos[1])
+            redraw = True
+        else:
+            redraw = count != self.shown_count
+            if self.shown_count > count:
+                self.fb.fill_rect(x + 8 * count, self.pos[1], 8 * (self.shown_count - count), 8, 0)
+        for i in range(count):
+            d = self.digits[count - 1 - i]
+            if redraw or d != self.shown[i]:
+                self.fb.blit(self.digit_glyphs[d], x + 8 * i, self.pos[1])
+                self.shown[i] = d
+        self.shown_count = count
+        self.text = name
+        self.value = value
+        self.changed = True
+
     def render_text(self, draw):
-        self.fb.text(self.text + ": " + str(self.value),
-                     self.pos[0],
-                     self.pos[1],
-                     draw)
+        label = self.labels.get(self.text) if self.labels else None
+        if label is None:
+            self.fb.text(self.text + ": " + str(self.value),
+                         self.pos[0],
+                         self.pos[1],
+                         draw)
+            return
+        self.fb.text(label, self.pos[0], self.pos[1], draw)
+        self.render_number(self.value, self.pos[0] + 8 * len(label), draw)
+
+    def render_number(self, value, x, draw):
+        d = 1
+        while d * 10 <= value:
+            d *= 10
+        while d:
+            self.fb.text(DIGITS[value // d % 10], x, self.pos[1], draw)
+            x += 8
+            d //= 10
+
+    def track(self, state):
+        self.deps = state.depends('header', [state.header] + state.properties)
 
     def update_frame(self, state):
+        if self.glyphs is not None:
+            self.update_glyphs(state)
+            return
+        if self.unchanged():
+            return
         self.clear()
-        self.text, value_getter = state.get_header()
-        self.value = value_getter().value
+        self.text = state.header_name()
+        self.value = state.header_property().value
         self.render_text(1)
 
 
 class Levels(Frame):
-    def __init__(self, width, height):
-        super().__init__(width,height)
+    def __init__(self, width, height, buffer=None, stride=None, x=0):
+        super().__init__(width, height, buffer, stride, x)
         self.level = 40
         self.render_levels(1)
 
@@ -202,20 +425,30 @@ class Levels(Frame):
                      self.pos[1] + self.height - self.level ,
                      draw)
 
+    def track(self, state):
+        self.deps = state.depends('levels', [state.header] + state.properties)
+
     def update_frame(self, state):
+        if self.unchanged():
+            return
         self.clear()
-        _, value_getter = state.get_header()
-        self.level = value_getter().scaled_value(self.height)
+        self.level = state.header_property().scaled_value(self.height)
         self.render_levels(1)
 
 class Display:
-    def __init__(self, sda, scl):
+    def __init__(self, sda, scl, partial_refresh=False, eye_cache=0, direct=False, threaded=False):
         self.width = 128  # oled display width
         self.height = 64  # oled display height
         self.sda = machine.Pin(sda)
         self.scl = machine.Pin(scl)
         self.i2c = machine.I2C(0, sda=self.sda, scl=self.scl, freq=400000)
         self.oled = SSD1306_I2C(self.width, self.height, self.i2c)
+        if partial_refresh:
+            # Only send the pages/columns that changed since the last frame
+            self.oled.partial_refresh()
+        if threaded:
+            # I2C transfers on the second core, render() returns after a copy
+            self.oled.start_sender()
         self.header_pos = [[0, 0],[self.width,8]]
         self.levels_pos = [[0, 8],[8,self.height]]
         self.eyes_pos = [[8, 8],[self.width,self.height]]
@@ -225,9 +458,36 @@ class Display:
                             self.levels_pos[1][1] - self.levels_pos[0][1]]
         self.eyes_size = [self.eyes_pos[1][0] - self.eyes_pos[0][0],
                             self.eyes_pos[1][1] - self.eyes_pos[0][1]]
-        self.header = Header(self.header_size[0], self.header_size[1])
-        self.levels = Levels(self.levels_size[0], self.levels_size[1])
-        self.eyes = Eyes(self.eyes_size[0], self.eyes_size[1])
+        # direct: frames draw straight into their region of the OLED buffer
+        # (regions must start on an 8 row page), no frame buffers or blits
+        self.direct = direct
+        if direct:
+            self.header = Header(self.header_size[0], self.header_size[1], self.view(self.header_pos), self.width,
+                                 self.header_pos[0][0])
+            self.levels = Levels(self.levels_size[0], self.levels_size[1], self.view(self.levels_pos), self.width,
+                                 self.levels_pos[0][0])
+            self.eyes = Eyes(self.eyes_size[0], self.eyes_size[1], self.view(self.eyes_pos), self.width,
+                             self.eyes_pos[0][0])
+        else:
+            self.header = Header(self.header_size[0], self.header_size[1])
+            self.levels = Levels(self.levels_size[0], self.levels_size[1])
+            self.eyes = Eyes(self.eyes_size[0], self.eyes_size[1])
+        if eye_cache:
+            self.eyes.enable_sprite_cache(eye_cache)
+
+    def preallocate(self, state):
+        # Allocation-free redraws where possible (see main.Ogreenes zero_alloc)
+        self.header.preallocate(state)
+
+    def view(self, pos):
+        # From the start of the region's first page row, see Frame
+        return memoryview(self.oled.buffer)[(pos[0][1] // 8) * self.width:]
+
+    def track(self, state):
+        # Only redraw frames (and the panel) when their inputs changed
+        self.eyes.track(state)
+        self.header.track(state)
+        self.levels.track(state)
 
     def update(self, state):
         self.eyes.autonomous_events()
@@ -237,20 +497,118 @@ class Display:
 
     def render(self, state):
         self.update(state)
+        if not (self.header.changed or self.eyes.changed or self.levels.changed):
+            return
+        if not self.direct:
+            self.blit()
+        self.oled.show()
+        self.header.changed = False
+        self.eyes.changed = False
+        self.levels.changed = False
+
+    def blit(self):
         self.oled.blit(self.header.fb, self.header_pos[0][0], self.header_pos[0][1])
         self.oled.blit(self.eyes.fb, self.eyes_pos[0][0], self.eyes_pos[0][1])
         self.oled.blit(self.levels.fb, self.levels_pos[0][0], self.levels_pos[0][1])
-        self.oled.show()
+
+    def bytes_saved(self):
+        # Bytes not sent over I2C on the last render (0 without partial refresh)
+        return self.oled.bytes_saved
 
 class Keyboard:
-    def __init__(self, gp, buttons):
+    def __init__(self, gp, buttons, use_irq=False, debounce_ms=20, long_press_ms=800, queue_size=16):
         self.buttons = buttons
         self.button = []
         self.lastbutton = None
         for i in range(gp, gp + self.buttons):
             self.button.append(machine.Pin(i, machine.Pin.IN))
+        self.use_irq = use_irq
+        self.notify = None
+        if use_irq:
+            # Everything the ISR touches is allocated here
+            micropython.alloc_emergency_exception_buf(100)
+            self.debounce_ms = debounce_ms
+            self.long_press_ms = long_press_ms
+            self.queue = bytearray(queue_size)
+            self.head = 0  # next slot to write (ISR)
+            self.tail = 0  # next slot to read (main loop)
+            self.overflow = 0
+            self.pressed = [0] * self.buttons
+            self.last_edge = [0] * self.buttons
+            self.press_time = [0] * self.buttons
+            for i in range(self.buttons):
+                self.button[i].irq(trigger=machine.Pin.IRQ_RISING | machine.Pin.IRQ_FALLING,
+                                   handler=self.make_isr(i))
+
+    def make_isr(self, i):
+        return lambda pin: self.isr(i)
+
+    def isr(self, i):
+        # Edges within debounce_ms of the last accepted one are bounce; the
+        # level they leave behind is picked up by settle()
+        now = utime.ticks_ms()
+        if utime.ticks_diff(now, self.last_edge[i]) < self.debounce_ms:
+            return
+        value = self.button[i].value()
+        if value == self.pressed[i]:
+            # An edge to the level we already had: the change before it was
+            # lost in a bounce, replay it first
+            self.change(i, 1 - value, now)
+        self.change(i, value, now)
+
+    def settle(self):
+        # Main loop side: accept levels that differ from pressed once the
+        # bounce window is over, the last edge of a bounce may have been
+        # dropped or read the old level
+        for i in range(self.buttons):
+            irq_state = machine.disable_irq()
+            now = utime.ticks_ms()
+            value = self.button[i].value()
+            if (value != self.pressed[i] and
+                    utime.ticks_diff(now, self.last_edge[i]) >= self.debounce_ms):
+                self.change(i, value, now)
+            machine.enable_irq(irq_state)
+
+    def change(self, i, value, now):
+        self.last_edge[i] = now
+        self.pressed[i] = value
+        if value:
+            self.press_time[i] = now
+            self.push(KEY_PRESS << 4 | i)
+        else:
+            if utime.ticks_diff(now, self.press_time[i]) >= self.long_press_ms:
+                self.push(KEY_LONG_PRESS << 4 | i)
+            self.push(KEY_RELEASE << 4 | i)
+        if self.notify is not None:
+            self.notify(self.button[i])
+
+    def push(self, event):
+        head = (self.head + 1) % len(self.queue)
+        if head == self.tail:
+            self.overflow += 1
+            return
+        self.queue[self.head] = event
+        self.head = head
+
+    def get_event(self):
+        # Next (event, button) from the IRQ queue, or None
+        if self.tail == self.head:
+            self.settle()
+        if self.tail == self.head:
+            return None
+        event = self.queue[self.tail]
+        self.tail = (self.tail + 1) % len(self.queue)
+        return event >> 4, event & 0x0f
 
     def read(self):
+        if self.use_irq:
+            # Same contract as polling: the button of the next press
+            event = self.get_event()
+            while event is not None:
+                if event[0] == KEY_PRESS:
+                    return event[1]
+                event = self.get_event()
+            return None
         button = None
         for i in range(self.buttons):
             if self.button[i].value() == 1:
@@ -265,6 +623,14 @@ class Keyboard:
         else:
             return None
 
+    def irq(self, handler):
+        if self.use_irq:
+            # Called after the debouncing ISR queued an event
+            self.notify = handler
+            return
+        for pin in self.button:
+            pin.irq(trigger=machine.Pin.IRQ_RISING | machine.Pin.IRQ_FALLING, handler=handler)
+
 class Mood:
     def __init__(self, repeat_range, pitch_range, pitch_step, step_speed, repeat_delay, duty_cycle, occurrence):
         self.repeat_range = repeat_range
@@ -276,8 +642,25 @@ class Mood:
         self.occurrence = occurrence  # every n seconds
 
 class Voice:
-    def __init__(self, gp):
+    def __init__(self, gp, background=True):
         self.buzzer = machine.PWM(machine.Pin(gp))
+        # Play sounds from a timer instead of blocking the main loop
+        self.background = background
+        self.timer = None
+        self.tick_ms = 1  # sequencer resolution
+        self.min_step_us = 50  # sweeps with step_speed=0 still take some time
+        self.schedule = []  # (start freq, freq step, steps, step_us, pause_us) per repeat
+        self.segments = 0
+        self.slots = None  # preallocated schedule, see preallocate()
+        self.segment = 0
+        self.segment_start = 0
+        self.playing = False
+        self.sounding = False
+        self.play_duty = 0
+        self.last_freq = 0
+        self.env = None
+        self.play_step_cb = self.play_step  # bound once, not on every start
+        self.checked = 0  # state.time of the last vocalize()
         angry = Mood(repeat_range=[3, 5],
                         pitch_range=[1500, 3000],
                         pitch_step=-1,
@@ -311,6 +694,17 @@ class Voice:
                       'content': content,
                       'depressed': depressed}
         self.mood = 'content'
+        self.deps = None
+
+    def preallocate(self):
+        # Schedule slots for the longest mood and per mood timings, filled
+        # by build_slots with integer draws, so starting a sound allocates
+        # nothing.
+        most = max(mood.repeat_range[1] for mood in self.moods.values())
+        self.slots = [[0] * 5 for _ in range(most)]
+        for mood in self.moods.values():
+            mood.step_us = max(int(mood.step_speed * 1000000), self.min_step_us)
+            mood.pause_us = int(mood.repeat_delay * 1000000)
 
     def diagnostics(self):
         self.buzzer.freq(3000)
@@ -327,6 +721,13 @@ class Voice:
     def randomize_number(self, r):
         return range(0, r[0] + int(random.random() * (r[1] - r[0])))
 
+    def randomize_sweep(self, r, step):
+        # Same draw as randomize_range, returned as (start, number of steps)
+        end = r[0] + int(random.random() * (r[1] - r[0]))
+        start = r[0] if step > 0 else r[1]
+        if (end - start) * step <= 0:
+            return start, 0
+        return start, (abs(end - start) + abs(step) - 1) // abs(step)
 
     def buzzer_off(self, on=True):
             self.buzzer.duty_u16(0)
@@ -355,13 +756,112 @@ class Voice:
             self.buzzer_off()
             utime.sleep(self.moods[self.mood].repeat_delay)
 
+    def build_schedule(self):
+        mood = self.moods[self.mood]
+        self.play_duty = mood.duty_cycle
+        if self.slots is not None:
+            self.build_slots(mood)
+            return
+        step_us = max(int(mood.step_speed * 1000000), self.min_step_us)
+        pause_us = int(mood.repeat_delay * 1000000)
+        self.schedule = []
+        for t in self.randomize_number(mood.repeat_range):
+            start, steps = self.randomize_sweep(mood.pitch_range, mood.pitch_step)
+            self.schedule.append((start, mood.pitch_step, steps, step_us, pause_us))
+        self.segments = len(self.schedule)
+
+    def build_slots(self, mood):
+        # Same distribution as the draws in build_schedule, randrange
+        # instead of int(random.random() * n)
+        r = mood.repeat_range
+        self.segments = r[0] + random.randrange(r[1] - r[0])
+        r = mood.pitch_range
+        step = mood.pitch_step
+        start = r[0] if step > 0 else r[1]
+        for i in range(self.segments):
+            end = r[0] + random.randrange(r[1] - r[0])
+            if (end - start) * step <= 0:
+                steps = 0
+            else:
+                steps = (abs(end - start) + abs(step) - 1) // abs(step)
+            slot = self.slots[i]
+            slot[0] = start
+            slot[1] = step
+            slot[2] = steps
+            slot[3] = mood.step_us
+            slot[4] = mood.pause_us
+        self.schedule = self.slots
+
+    def start_sounds(self, env):
+        self.build_schedule()
+        self.env = env
+        self.env.generating_sound = True
+        self.segment = 0
+        self.segment_start = utime.ticks_us()
+        self.playing = True
+        self.sounding = False
+        self.last_freq = 0
+        if self.timer is None:
+            self.timer = machine.Timer()
+        self.timer.init(period=self.tick_ms, mode=machine.Timer.PERIODIC, callback=self.play_step_cb)
+
+    def stop_sounds(self):
+        if self.timer is not None:
+            self.timer.deinit()
+        self.buzzer_off()
+        self.sounding = False
+        self.playing = False
+        if self.env is not None:
+            self.env.generating_sound = False
+            self.env.sound_end = utime.ticks_ms()
+
+    def play_step(self, timer=None):
+        # Timer callback: set the buzzer to where the schedule is at now
+        while self.segment < self.segments:
+            start, step, steps, step_us, pause_us = self.schedule[self.segment]
+            elapsed = utime.ticks_diff(utime.ticks_us(), self.segment_start)
+            i = elapsed // step_us
+            if i < steps:
+                if not self.sounding:
+                    self.buzzer.duty_u16(self.play_duty)
+                    self.sounding = True
+                frequency = start + i * step
+                if frequency != self.last_freq:
+                    self.buzzer.freq(frequency)
+                    self.last_freq = frequency
+                return
+            if self.sounding:
+                self.buzzer_off()
+                self.sounding = False
+            if elapsed < steps * step_us + pause_us:
+                return
+            self.segment_start = utime.ticks_add(self.segment_start, steps * step_us + pause_us)
+            self.segment += 1
+        self.stop_sounds()
+
+    def track(self, state):
+        self.deps = state.depends('voice', [state.happiness, state.arousal])
+
     def vocalize(self, state):
-        self.update(state)
-        if (state.env.sound or (state.time % self.moods[self.mood].occurrence) == 0) and not state.asleep:
+        if self.deps is None or self.deps.changed():
+            self.update(state)
+        # Periodic occurrence: a multiple of occurrence was passed since the
+        # last call, also when live() caught up several ticks at once
+        occurrence = self.moods[self.mood].occurrence
+        due = state.time // occurrence != self.checked // occurrence
+        self.checked = state.time
+        if self.playing:
+            return
+        if (state.env.sound or due) and not state.asleep:
             # When not asleep, vocalize in response to sound or periodic occurrence
+            if self.background:
+                # Returns immediately, play_step clears generating_sound when done
+                self.start_sounds(state.env)
+                return
             state.env.generating_sound = True
             self.generate_sounds()
             state.env.generating_sound = False
+            state.env.sound_end = utime.ticks_ms()
 
 
 class RgbColor:
@@ -372,6 +872,7 @@ class RgbColor:
         self.freq = 1000
         self.max_value = 255
         self.pin = machine.PWM(machine.Pin(pin))
+        self.duty = -1
         self.on()
 
     def on(self):
@@ -380,10 +881,18 @@ class RgbColor:
     def set_value(self, value):
         self.pin.duty_u16(self.max_duty - int(self.range*value/self.max_value))
 
+    def set_level(self, value):
+        # Integer-only set_value, skips the PWM write when nothing changed
+        duty = self.max_duty - self.range * value // self.max_value
+        if duty != self.duty:
+            self.duty = duty
+            self.pin.duty_u16(duty)
+
 
 class ColorMap:
     def __init__(self):
         self.max_rgb = 255
+        self.rgb_out = [0, 0, 0]  # reused by get_color
         red = 1.7 * math.pi
         self.rgb = [red]
         for i in range(2):
@@ -393,8 +902,9 @@ class ColorMap:
             self.rgb.append(rad)
 
     def get_color(self, rad):
-        rgb_out = []
-        for i in self.rgb:
+        rgb_out = self.rgb_out
+        for c in range(3):
+            i = self.rgb[c]
             # Normalize: 0 rad is the center for color
             rad_norm = rad - i
             if rad_norm < 0:
@@ -404,11 +914,11 @@ class ColorMap:
                 rad_norm = -1 * rad_norm + 2 * math.pi
             # Invert
             rad_norm = math.pi - rad_norm
-            rgb_out.append(int(self.max_rgb * rad_norm/math.pi))
+            rgb_out[c] = int(self.max_rgb * rad_norm/math.pi)
         return rgb_out
 
 class Nose:
-    def __init__(self, gp):
+    def __init__(self, gp, use_lut=False):
         self.rgb_led = []
         for i in range(3):
             self.rgb_led.append(RgbColor(gp + i))
@@ -418,7 +928,12 @@ class Nose:
         self.brightness_pulsate = 0
         self.brightness_pulsate_speed = 1
         self.brightness_pulsate_on = False
+        self.rgb_out = [0, 0, 0]  # reused by set_brightness
         self.rgb_to_color(self.set_brightness([0,0,0]))
+        self.angle_lut = None
+        self.deps = None
+        if use_lut:
+            self.build_lut()
 
     def diagnostics(self):
         for b in range(self.brightness):
@@ -448,9 +963,9 @@ class Nose:
         return angle
 
     def set_brightness(self, rgb):
-        rgb_out = []
-        for c in rgb:
-            rgb_out.append(int(c*(self.brightness - self.brightness_pulsate)/100))
+        rgb_out = self.rgb_out
+        for i in range(3):
+            rgb_out[i] = int(rgb[i]*(self.brightness - self.brightness_pulsate)/100)
         return rgb_out
 
     def cartesian_to_color(self, x, y):
@@ -458,7 +973,39 @@ class Nose:
         rgb = self.color_map.get_color(angle)
         self.rgb_to_color(self.set_brightness(rgb))
 
+    def build_lut(self, happiness_max=100, arousal_max=100, angle_steps=256):
+        # (happiness, arousal) cell -> quantized angle, angle -> rgb.
+        # Built once, Nose.update then only does integer lookups.
+        self.lut_stride = arousal_max + 1
+        self.angle_lut = bytearray((happiness_max + 1) * self.lut_stride)
+        for h in range(happiness_max + 1):
+            for a in range(arousal_max + 1):
+                angle = self.cartesian_to_angle(h - int(happiness_max/2), a - int(arousal_max/2))
+                self.angle_lut[h * self.lut_stride + a] = int(angle * angle_steps / (2 * math.pi)) % angle_steps
+        self.color_lut = bytearray(3 * angle_steps)
+        for i in range(angle_steps):
+            rgb = self.color_map.get_color((i + 0.5) * 2 * math.pi / angle_steps)
+            for c in range(3):
+                self.color_lut[3 * i + c] = rgb[c]
+
+    def update_lut(self, state):
+        base = 3 * self.angle_lut[state.happiness.value * self.lut_stride + state.arousal.value]
+        brightness = self.brightness - self.brightness_pulsate
+        for i in range(3):
+            self.rgb_led[i].set_level(self.color_lut[base + i] * brightness // 100)
+        if self.brightness_pulsate_on:
+            self.pulsate()
+
+    def track(self, state):
+        self.deps = state.depends('nose', [state.happiness, state.arousal])
+
     def update(self, state):
+        if (self.deps is not None and not self.brightness_pulsate_on
+                and not self.deps.changed()):
+            return
+        if self.angle_lut is not None:
+            self.update_lut(state)
+            return
         # map to pos/neg coordinates: normalize to max/2
         x = state.happiness.value - int(state.happiness.max/2)
         y = state.arousal.value - int(state.arousal.max/2)
@@ -467,27 +1014,118 @@ class Nose:
             self.pulsate()
 
 class LightSensor:
-    def __init__(self, pin):
+    def __init__(self, pin, burst=0, use_median=True, ema_shift=2, hysteresis=2000,
+                 max_interval=32, stable_delta=500):
         self.photo_resistor = machine.ADC(pin)
         self.dark_threshold = 40000
         self.value = 0
+        # burst > 0: filter bursts of samples, switch with hysteresis around
+        # dark_threshold and sample less often while readings are stable.
+        self.burst = burst
+        if burst:
+            self.samples = array('H', [0] * burst)
+            self.use_median = use_median  # otherwise EMA with weight 1/2**ema_shift
+            self.ema_shift = ema_shift
+            self.hysteresis = hysteresis
+            self.max_interval = max_interval  # ticks
+            self.stable_delta = stable_delta
+            self.interval = 1
+            self.countdown = 0
+            self.dark = False
+            self.primed = False
 
     def diagnostics(self):
         self.value = self.photo_resistor.read_u16()
 
+    def median(self):
+        # In-place insertion sort of the burst, no allocation
+        s = self.samples
+        for i in range(1, len(s)):
+            v = s[i]
+            j = i - 1
+            while j >= 0 and s[j] > v:
+                s[j + 1] = s[j]
+                j -= 1
+            s[j + 1] = v
+        return s[len(s) // 2]
+
+    def sample(self):
+        for i in range(self.burst):
+            self.samples[i] = self.photo_resistor.read_u16()
+        if self.use_median:
+            return self.median()
+        value = self.value if self.primed else self.samples[0]
+        for v in self.samples:
+            value += (v - value) >> self.ema_shift
+        return value
+
     def update(self, state):
+        if self.burst:
+            self.update_filtered(state)
+            return
         self.value = self.photo_resistor.read_u16()
         state.env.dark = self.value > self.dark_threshold
 
+    def update_filtered(self, state):
+        if self.countdown > 0:
+            self.countdown -= 1
+            state.env.dark = self.dark
+            return
+        value = self.sample()
+        if self.primed and abs(value - self.value) < self.stable_delta:
+            self.interval = min(self.interval * 2, self.max_interval)
+        else:
+            self.interval = 1
+        self.countdown = self.interval - 1
+        self.value = value
+        if not self.primed:
+            self.dark = value > self.dark_threshold
+            self.primed = True
+        elif value > self.dark_threshold + self.hysteresis:
+            self.dark = True
+        elif value < self.dark_threshold - self.hysteresis:
+            self.dark = False
+        state.env.dark = self.dark
+
 class Ear:
-    def __init__(self, gp):
+    def __init__(self, gp, counting=False, decay=0.8, full_scale=20, mask_ms=50):
         self.sound_detector = machine.Pin(gp, machine.Pin.IN)
+        # Count rising edges by IRQ between updates instead of sampling once
+        self.counting = counting
+        self.env = None
+        if counting:
+            self.edges = 0
+            self.masked = 0
+            # Integer envelope in 1/256 edges, no float math per update
+            self.envelope = 0
+            self.decay = int(decay * 256)  # per update, in 1/256
+            self.full_scale = full_scale << 8  # envelope for intensity 100
+            self.mask_ms = mask_ms  # ignore edges this long after our own sound
+            self.sound_detector.irq(trigger=machine.Pin.IRQ_RISING, handler=self.isr)
+
+    def isr(self, pin):
+        env = self.env
+        if env is not None and (env.generating_sound or
+                                utime.ticks_diff(utime.ticks_ms(), env.sound_end) < self.mask_ms):
+            self.masked += 1
+            return
+        self.edges += 1
 
     def diagnostics(self):
         if self.sound_detector.value() == 1:
             print('Too Noisy')
 
     def update(self, state):
+        if self.counting:
+            self.env = state.env
+            irq_state = machine.disable_irq()
+            edges = self.edges
+            self.edges = 0
+            machine.enable_irq(irq_state)
+            self.envelope = ((self.envelope * self.decay) >> 8) + (edges << 8)
+            state.env.sound = edges > 0
+            state.env.sound_intensity = min(100, 100 * self.envelope // self.full_scale)
+            return
         if not state.env.generating_sound: # Necessary? Everything is serialized...
             state.env.sound = self.sound_detector.value() == 1
         else:
@@ -0,0 +1,155 @@
+# Per-tick hot path benchmarks on the host backend.
+#   python host/bench.py --save-baseline     # run and store as the new baseline
+#   python host/bench.py                     # run, compare to host/bench_baseline.json
+# Timings depend on the machine, so the baseline is not committed: save one
+# before changing the hot path. Results are us per call, best of --repeat
+# runs, also written as JSON with --output. Exits with 1 when a benchmark is
+# slower than baseline by more than --tolerance, 2 when there is no baseline.
+import os
+import sys
+import json
+import random
+import itertools
+import argparse
+import time
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HOST, os.path.dirname(HOST)]
+
+import machine
+from eg_state import State
+from eg_utils import Display, Keyboard, Nose
+from main import GP0, GP4, GP5, GP7
+
+BASELINE = os.path.join(HOST, 'bench_baseline.json')
+
+
+def awake(state):
+    state.env.dark = False
+    state.env.sound = False
+    state.asleep = False
+    machine.set_input(GP0, 0)
+
+
+def asleep(state):
+    state.env.dark = True
+    state.asleep = True
+    state.fatigue.time_dark = state.fatigue.time_to_falling_asleep
+    machine.set_input(GP0, 0)
+
+
+def dying(state):
+    state.energy.set(1)
+    state.happiness.set(5)
+    state.alive = False
+    machine.set_input(GP0, 0)
+
+
+def noisy(state):
+    state.env.sound = True
+    state.arousal.set(90)
+    # Button 0 toggles on every read
+    presses = itertools.cycle((0, 1))
+    machine.set_input(GP0, lambda t: next(presses))
+
+
+SCENARIOS = {'awake': awake, 'asleep': asleep, 'dying': dying, 'noisy': noisy}
+
+
+TARGETS = ('State.update', 'Display.update', 'Display.render',
+           'Eyes.update_frame', 'Header.update_frame', 'Levels.update_frame',
+           'Nose.update', 'ColorMap.get_color', 'Keyboard.read')
+
+
+def targets(state, dp, nose, kb):
+    return {'State.update': state.update,
+            'Display.update': lambda: dp.update(state),
+            'Display.render': lambda: dp.render(state),
+            'Eyes.update_frame': lambda: dp.eyes.update_frame(state),
+            'Header.update_frame': lambda: dp.header.update_frame(state),
+            'Levels.update_frame': lambda: dp.levels.update_frame(state),
+            'Nose.update': lambda: nose.update(state),
+            'ColorMap.get_color': lambda: nose.color_map.get_color(2.5),
+            'Keyboard.read': kb.read}
+
+
+def measure(func, number, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        per_call = (time.perf_counter_ns() - start) / number / 1000
+        if best is None or per_call < best:
+            best = per_call
+    return best
+
+
+def run(number, repeat, only=None):
+    results = {}
+    for scenario, setup in SCENARIOS.items():
+        for name in TARGETS:
+            if only and only not in name:
+                continue
+            random.seed(0)
+            # Fresh devices, so no scenario inherits another's eyes_state etc.
+            dp = Display(sda=GP4, scl=GP5)
+            nose = Nose(GP7)
+            kb = Keyboard(GP0, 3)
+            state = State()
+            setup(state)
+            func = targets(state, dp, nose, kb)[name]
+            results[scenario + '/' + name] = round(measure(func, number, repeat), 2)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, us in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            print('%-36s %9.2f us   (new)' % (key, us))
+            continue
+        change = (us - base) / base if base else 0
+        flag = ''
+        if change > tolerance:
+            flag = '  REGRESSION'
+            regressions.append(key)
+        print('%-36s %9.2f us %+7.1f%%%s' % (key, us, 100 * change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the per-tick hot path on the host backend')
+    parser.add_argument('--number', type=int, default=200, help='calls per run')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per benchmark, the best is kept')
+    parser.add_argument('--only', help='only benchmarks whose name contains this')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown, 0.2 is 20%%')
+    args = parser.parse_args()
+
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        print('no baseline at %s, run with --save-baseline first' % args.baseline)
+        return 2
+    results = run(args.number, args.repeat, args.only)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print('saved baseline to', args.baseline)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print('%d regression(s)' % len(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+# Equivalence checks for the optimized paths, on the host backend:
+#   python host/check.py                 # all checks
+#   python host/check.py trace panel     # only these
+# Each check compares an optimized path against the plain one it replaces and
+# raises AssertionError (ValueError for a log that does not decode) at the
+# first difference. Exits with 1 when any fails.
+import os
+import sys
+import io
+import random
+import argparse
+import tempfile
+import contextlib
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HOST, os.path.dirname(HOST)]
+
+import utime
+import machine
+from eg_state import State
+from eg_store import restore_state
+from main import Ogreenes, GP0, GP10, GP27
+
+
+def reset(seed):
+    # Same randomness and virtual clock for every run that is compared
+    random.seed(seed)
+    utime.count_work = False
+    utime._skipped_us = 0
+    del utime.timers[:]
+    machine.set_irq_poll(0)
+
+
+def script_inputs(sound_every=7000):
+    # Dark every other minute, a button 0 press every 7 s, button 1 every 11 s,
+    # a 40 ms sound every sound_every ms
+    machine.set_input(GP27, lambda t: 50000 if (t // 60000) % 2 else 1000)
+    machine.set_input(GP10, lambda t: 1 if t % sound_every < 40 else 0)
+    machine.set_input(GP0, lambda t: 1 if (t // 1000) % 7 == 0 else 0)
+    machine.set_input(GP0 + 1, lambda t: 1 if (t // 1000) % 11 == 0 else 0)
+    machine.set_input(GP0 + 2, 0)
+
+
+def live(ticks, seed, each=None, **options):
+    # Run Ogreenes(**options) for ticks state ticks, each(fred) after every sleep
+    reset(seed)
+    fred = Ogreenes(**options)
+
+    def hook(now):
+        if each:
+            each(fred)
+        if fred.state.time >= ticks:
+            fred.state.alive = False
+    utime.hooks.append(hook)
+    try:
+        fred.live()
+    finally:
+        utime.hooks.remove(hook)
+    return fred
+
+
+def random_state(rng):
+    state = State()
+    record = ([0, rng.randrange(100000)] +
+              [rng.randrange(p.max) for p in state.properties] +
+              [rng.randrange(len(state.header_names)), 1, rng.randrange(3), rng.randrange(3)])
+    restore_state(state, record)
+    return state
+
+
+def check_advance(args):
+    # State.advance(n) against n update() calls with the same env
+    from eg_trace import state_hash
+    rng = random.Random(args.seed)
+    for case in range(args.cases):
+        a = random_state(rng)
+        b = State()
+        restore_state(b, [0, a.time] + [p.value for p in a.properties] +
+                      [a.header.value, 1, a.fatigue.time_dark, a.fatigue.time_to_falling_asleep])
+        for s in (a, b):
+            s.asleep = False
+        for _ in range(4):
+            dark = rng.random() < 0.5
+            sound = rng.random() < 0.3
+            # Short runs too, long sound runs saturate attention and arousal
+            n = rng.randrange(1, rng.choice((30, args.ticks)))
+            for s in (a, b):
+                s.env.dark = dark
+                s.env.sound = sound
+            a.advance(n)
+            for _ in range(n):
+                b.update()
+            assert state_hash(a) == state_hash(b), \
+                'case %d: advance(%d) dark=%s sound=%s differs from update()' % (case, n, dark, sound)
+    return '%d cases' % args.cases
+
+
+def check_fleet(args):
+    # eg_fleet.Fleet against scalar States with the same timebases
+    try:
+        from eg_fleet import Fleet, snapshot
+    except ImportError:
+        return None
+    rng = random.Random(args.seed)
+    n = 8
+    fleet = Fleet(State(), n)
+    states = [State() for _ in range(n)]
+    for name in ('energy', 'happiness', 'fatigue'):
+        timebases = [getattr(states[0], name).timebase // rng.randrange(1, 20) or 1
+                     for _ in range(n)]
+        fleet.set_timebase(name, timebases)
+        for state, timebase in zip(states, timebases):
+            getattr(state, name).timebase = timebase
+    dark = sound = False
+    for tick in range(args.ticks * 4):
+        if tick % 500 == 0:
+            dark = rng.random() < 0.5
+        sound = rng.random() < 0.02
+        if tick % 300 == 0:
+            fleet.input_update('energy', 5, fleet.alive)
+        for state in states:
+            state.env.dark = dark
+            state.env.sound = sound
+            if tick % 300 == 0:
+                state.energy.input_update(5)
+            state.update()
+        fleet.update(dark, sound)
+        for i in range(n):
+            assert snapshot(states[i]) == fleet.snapshot(i), \
+                'creature %d differs at tick %d' % (i, tick)
+    return '%d creatures, %d ticks' % (n, args.ticks * 4)
+
+
+def check_panel(args):
+    # Direct rendering, the eye sprite cache and header glyphs against blit
+    frames = {}
+    variants = {'blit': {},
+                'direct': {'direct': True},
+                'direct+eye_cache': {'direct': True, 'eye_cache': 8192},
+                'glyph_cache': {'glyph_cache': True}}
+    for name, options in variants.items():
+        script_inputs()
+        frames[name] = out = []
+        live(args.ticks, args.seed, lambda fred: out.append(bytes(fred.dp.oled.buffer)), **options)
+    for name in variants:
+        for i, (a, b) in enumerate(zip(frames['blit'], frames[name])):
+            assert a == b, '%s frame %d differs from blit' % (name, i)
+        assert len(frames[name]) == len(frames['blit']), \
+            '%s drew %d frames, blit %d' % (name, len(frames[name]), len(frames['blit']))
+    return '%d frames' % len(frames['blit'])
+
+
+def check_telemetry(args):
+    # Every stored record comes back out of host/telemetry.py, file and serial
+    import struct
+    import telemetry
+    from eg_telemetry import Telemetry, RECORD, RECORD_SIZE
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in (os.path.join(tmp, 'telemetry.bin'), None):
+            reset(args.seed)
+            log = Telemetry(path, capacity=64, flush_every=5, batch=3, buffer_size=64)
+            state = State()
+            expected = []
+            console = io.StringIO()
+            with contextlib.redirect_stdout(console):
+                for tick in range(args.ticks * 4):
+                    state.env.dark = (tick // 700) % 2 == 1
+                    state.env.sound = rng.random() < 0.05
+                    state.update()
+                    if log.sample(state, rng.choice(('joy', 'content'))):
+                        off = (log.head - 1) % log.slots * RECORD_SIZE
+                        expected.append(struct.unpack_from(RECORD, log.buf, off))
+                    log.step()
+                    utime.advance(state.timestep * 1000000)
+                log.flush()
+            assert not log.lost, '%d records lost' % log.lost
+            if path is None:
+                path = os.path.join(tmp, 'console.txt')
+                with open(path, 'w') as f:
+                    f.write('boot\n' + console.getvalue())
+            records = telemetry.read_log(path)
+            assert records == expected, '%s: decoded %d records, expected %d' % (
+                os.path.basename(path), len(records), len(expected))
+    return '%d records' % len(expected)
+
+
+def check_trace(args):
+    # Replaying a recorded trace ends in the State the live run ended in
+    from eg_trace import read_trace, replay, state_hash
+    variants = {'plain': {},
+                'catchup': {'schedule': 'catchup'},
+                'power_save': {'power_save': True}}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, options in variants.items():
+            path = os.path.join(tmp, name + '.bin')
+            script_inputs(sound_every=90000 if 'power_save' in options else 7000)
+            ticks = args.ticks * 4 if 'power_save' in options else args.ticks
+            fred = live(ticks, args.seed, trace=path, **options)
+            fred.state.alive = True  # stopped by live(), not dead
+            state = State()
+            replay(state, *read_trace(path))
+            assert state_hash(state) == state_hash(fred.state), '%s: replay %08x, live %08x' % (
+                name, state_hash(state), state_hash(fred.state))
+            results.append('%s %08x' % (name, state_hash(state)) +
+                           (' (%d dozes)' % fred.power.dozes if fred.power else ''))
+    return ', '.join(results)
+
+
+CHECKS = {'advance': check_advance,
+          'fleet': check_fleet,
+          'panel': check_panel,
+          'telemetry': check_telemetry,
+          'trace': check_trace}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the optimized paths against the plain ones')
+    parser.add_argument('checks', nargs='*', help='checks to run (%s), all by default' %
+                        ', '.join(CHECKS))
+    parser.add_argument('--ticks', type=int, default=5000, help='state ticks per live run')
+    parser.add_argument('--cases', type=int, default=50, help='random states for advance')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for name in args.checks:
+        if name not in CHECKS:
+            parser.error('unknown check ' + name)
+
+    failed = 0
+    for name in args.checks or CHECKS:
+        try:
+            # The creature's own prints (diagnostics, console telemetry)
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = CHECKS[name](args)
+        except (AssertionError, ValueError) as e:
+            print('%-10s FAILED  %s' % (name, e))
+            failed += 1
+            continue
+        print('%-10s %s' % (name, 'skipped (no numpy)' if result is None else 'ok      ' + result))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
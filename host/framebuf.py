@@ -0,0 +1,317 @@
+# Host stand-in for the MicroPython framebuf module (mono formats only).
+# Drawing follows the algorithms of extmod/modframebuf.c so frames match
+# the device pixel for pixel. The built-in 8x8 font is loaded from
+# font_petme128_8x8.bin next to this file when present (768 bytes,
+# chars 32-127, 8 column bytes each, LSB on top); without it every
+# character gets a stand-in glyph of its own, so frames still differ
+# whenever the text does.
+import os
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+FONT = None
+_font_path = os.path.join(os.path.dirname(__file__), 'font_petme128_8x8.bin')
+if os.path.exists(_font_path):
+    with open(_font_path, 'rb') as f:
+        FONT = f.read()
+# Stand-in glyphs for chars 32-127: column 1 is the char code, so no two
+# are alike, the other columns spread its bits
+_STAND_IN = bytes(c for code in range(32, 128)
+                  for c in [0, code] + [(code * (2 * k + 1) * 29 >> k) & 0xff for k in range(2, 7)] + [0])
+# HLSB byte -> 8 VLSB column bytes (little endian int) with bit 0 set per lit pixel
+_SPREAD = [sum(1 << (8 * k) for k in range(8) if b & (0x80 >> k)) for b in range(256)]
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format not in (MONO_VLSB, MONO_HLSB, MONO_HMSB):
+            raise ValueError('invalid format')
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.format = format
+        self.stride = width if stride is None else stride
+        if format != MONO_VLSB:
+            self.stride = (self.stride + 7) & ~7
+        # Same length check as MicroPython's framebuf_make_new
+        height_required = (height + 7) & ~7 if format == MONO_VLSB else height
+        if height_required * self.stride // 8 > len(buffer):
+            raise ValueError('buffer too small')
+        # A view into a wider buffer can not be filled as one slice
+        self.packed = self.stride == (width if format == MONO_VLSB else (width + 7) & ~7)
+
+    def _index(self, x, y):
+        if self.format == MONO_VLSB:
+            return (y >> 3) * self.stride + x, 1 << (y & 7)
+        if self.format == MONO_HLSB:
+            return (x + y * self.stride) >> 3, 0x80 >> (x & 7)
+        return (x + y * self.stride) >> 3, 1 << (x & 7)
+
+    def _set(self, x, y, c):
+        i, bit = self._index(x, y)
+        if c & 1:
+            self.buffer[i] |= bit
+        else:
+            self.buffer[i] &= ~bit & 0xff
+
+    def _set_checked(self, x, y, c, mask=1):
+        if mask and 0 <= x < self.width and 0 <= y < self.height:
+            self._set(x, y, c)
+
+    def _lit(self):
+        # Coordinates of all set pixels, skipping empty bytes
+        buf = self.buffer
+        if self.format == MONO_VLSB:
+            for page in range((self.height + 7) >> 3):
+                base = page * self.stride
+                for x in range(self.width):
+                    b = buf[base + x]
+                    y = page * 8
+                    while b:
+                        if b & 1 and y < self.height:
+                            yield x, y
+                        b >>= 1
+                        y += 1
+            return
+        row_bytes = self.stride >> 3
+        for y in range(self.height):
+            base = y * row_bytes
+            for bx in range(row_bytes):
+                b = buf[base + bx]
+                if not b:
+                    continue
+                for k in range(8):
+                    bit = 0x80 >> k if self.format == MONO_HLSB else 1 << k
+                    x = bx * 8 + k
+                    if b & bit and x < self.width:
+                        yield x, y
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        if c is None:
+            i, bit = self._index(x, y)
+            return 1 if self.buffer[i] & bit else 0
+        self._set(x, y, c)
+
+    def fill(self, c):
+        if not self.packed:
+            self.fill_rect(0, 0, self.width, self.height, c)
+            return
+        v = 0xff if c & 1 else 0
+        end = len(self.buffer)
+        if self.format == MONO_VLSB:
+            end = ((self.height + 7) >> 3) * self.stride
+        else:
+            end = (self.stride * self.height) >> 3
+        self.buffer[0:end] = bytes([v]) * end
+
+    def fill_rect(self, x, y, w, h, c):
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self.width)
+        y1 = min(y + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        buf = self.buffer
+        on = c & 1
+        if self.format == MONO_VLSB:
+            # One masked byte per column and page
+            for page in range(y0 >> 3, ((y1 - 1) >> 3) + 1):
+                top = max(y0 - page * 8, 0)
+                bottom = min(y1 - page * 8, 8)
+                mask = ((0xff << top) & 0xff) & (0xff >> (8 - bottom))
+                base = page * self.stride
+                for i in range(base + x0, base + x1):
+                    buf[i] = buf[i] | mask if on else buf[i] & ~mask & 0xff
+        else:
+            # One masked byte per 8 pixels of each row
+            for yy in range(y0, y1):
+                row = yy * self.stride
+                xx = x0
+                while xx < x1:
+                    a = xx & 7
+                    b = min(8, a + x1 - xx)
+                    if self.format == MONO_HLSB:
+                        mask = (0xff >> a) & (0xff << (8 - b)) & 0xff
+                    else:
+                        mask = ((0xff << a) & 0xff) & (0xff >> (8 - b))
+                    i = (row + xx) >> 3
+                    buf[i] = buf[i] | mask if on else buf[i] & ~mask & 0xff
+                    xx += b - a
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.fill_rect(x, y, w, 1, c)
+        self.fill_rect(x, y + h - 1, w, 1, c)
+        self.fill_rect(x, y, 1, h, c)
+        self.fill_rect(x + w - 1, y, 1, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx = x2 - x1
+        sx = 1 if dx > 0 else -1
+        dx = abs(dx)
+        dy = y2 - y1
+        sy = 1 if dy > 0 else -1
+        dy = abs(dy)
+        steep = dy > dx
+        if steep:
+            x1, y1 = y1, x1
+            dx, dy = dy, dx
+            sx, sy = sy, sx
+        e = 2 * dy - dx
+        for _ in range(dx):
+            if steep:
+                self._set_checked(y1, x1, c)
+            else:
+                self._set_checked(x1, y1, c)
+            while e >= 0:
+                y1 += sy
+                e -= 2 * dx
+            x1 += sx
+            e += 2 * dy
+        self._set_checked(x2, y2, c)
+
+    def _ellipse_points(self, cx, cy, x, y, c, mask):
+        if mask & 0x10:
+            if mask & 1:
+                self.fill_rect(cx, cy - y, x + 1, 1, c)
+            if mask & 2:
+                self.fill_rect(cx - x, cy - y, x + 1, 1, c)
+            if mask & 4:
+                self.fill_rect(cx - x, cy + y, x + 1, 1, c)
+            if mask & 8:
+                self.fill_rect(cx, cy + y, x + 1, 1, c)
+        else:
+            self._set_checked(cx + x, cy - y, c, mask & 1)
+            self._set_checked(cx - x, cy - y, c, mask & 2)
+            self._set_checked(cx - x, cy + y, c, mask & 4)
+            self._set_checked(cx + x, cy + y, c, mask & 8)
+
+    def ellipse(self, cx, cy, xr, yr, c, f=False, m=0xf):
+        mask = (m & 0xf) | (0x10 if f else 0)
+        two_asquare = 2 * xr * xr
+        two_bsquare = 2 * yr * yr
+        x = xr
+        y = 0
+        xchange = yr * yr * (1 - 2 * xr)
+        ychange = xr * xr
+        error = 0
+        stoppingx = two_bsquare * xr
+        stoppingy = 0
+        while stoppingx >= stoppingy:
+            self._ellipse_points(cx, cy, x, y, c, mask)
+            y += 1
+            stoppingy += two_asquare
+            error += ychange
+            ychange += two_asquare
+            if 2 * error + xchange > 0:
+                x -= 1
+                stoppingx -= two_bsquare
+                error += xchange
+                xchange += two_bsquare
+        x = 0
+        y = yr
+        xchange = yr * yr
+        ychange = xr * xr * (1 - 2 * yr)
+        error = 0
+        stoppingx = 0
+        stoppingy = two_asquare * yr
+        while stoppingx <= stoppingy:
+            self._ellipse_points(cx, cy, x, y, c, mask)
+            x += 1
+            stoppingx += two_bsquare
+            error += xchange
+            xchange += two_bsquare
+            if 2 * error + ychange > 0:
+                y -= 1
+                stoppingy -= two_asquare
+                error += ychange
+                ychange += two_asquare
+
+    def text(self, s, x0, y0, c=1):
+        for ch in s:
+            code = ord(ch)
+            if code < 32 or code > 127:
+                code = 127
+            if ch == ' ':
+                glyph = bytes(8)
+            elif FONT is not None:
+                glyph = FONT[(code - 32) * 8:(code - 31) * 8]
+            else:
+                glyph = _STAND_IN[(code - 32) * 8:(code - 31) * 8]
+            for col in glyph:
+                if 0 <= x0 < self.width:
+                    y = y0
+                    while col:
+                        if col & 1 and 0 <= y < self.height:
+                            self._set(x0, y, c)
+                        col >>= 1
+                        y += 1
+                x0 += 1
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        # Clear the destination rectangle then copy set pixels, so
+        # without a key the source fully replaces the area like on device.
+        if (key == -1 and palette is None and self.format == MONO_VLSB
+                and fbuf.format == MONO_HLSB and x >= 0 and y >= 0 and y % 8 == 0
+                and fbuf.height % 8 == 0 and x + fbuf.width <= self.width
+                and y + fbuf.height <= self.height):
+            self._blit_hlsb(fbuf, x, y)
+            return
+        if key == -1 and palette is None:
+            self.fill_rect(x, y, fbuf.width, fbuf.height, 0)
+            for sx, sy in fbuf._lit():
+                tx = x + sx
+                ty = y + sy
+                if 0 <= tx < self.width and 0 <= ty < self.height:
+                    self._set(tx, ty, 1)
+            return
+        for sy in range(max(0, -y), min(fbuf.height, self.height - y)):
+            for sx in range(max(0, -x), min(fbuf.width, self.width - x)):
+                col = fbuf.pixel(sx, sy)
+                if palette is not None:
+                    col = palette.pixel(col, 0)
+                if col != key:
+                    self._set(x + sx, y + sy, col)
+
+    def _blit_hlsb(self, fbuf, x, y):
+        # Transpose 8x8 blocks of an HLSB source into VLSB column bytes
+        src = fbuf.buffer
+        row_bytes = fbuf.stride >> 3
+        for block_row in range(fbuf.height >> 3):
+            dest = ((y >> 3) + block_row) * self.stride + x
+            base = block_row * 8 * row_bytes
+            for bx in range((fbuf.width + 7) >> 3):
+                block = 0
+                i = base + bx
+                for r in range(8):
+                    b = src[i]
+                    if b:
+                        block |= _SPREAD[b] << r
+                    i += row_bytes
+                n = min(8, fbuf.width - bx * 8)
+                self.buffer[dest:dest + n] = block.to_bytes(8, 'little')[:n]
+                dest += n
+
+    def scroll(self, xstep, ystep):
+        copy = FrameBuffer(bytearray(self.buffer), self.width, self.height, self.format, self.stride)
+        self.fill(0)
+        for yy in range(self.height):
+            for xx in range(self.width):
+                if copy.pixel(xx, yy):
+                    self.pixel(xx + xstep, yy + ystep, 1)
+
+
+def FrameBuffer1(buffer, width, height, stride=None):
+    return FrameBuffer(buffer, width, height, MONO_VLSB, stride)
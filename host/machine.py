@@ -0,0 +1,222 @@
+# Host stand-in for the machine module. Inputs are scripted per pin with
+# set_input(pin, source), source being a value or a function of ticks_ms().
+# Pin values are 0/1, ADC values 0-65535. Outputs are recorded on the
+# device objects for inspection.
+import utime
+
+inputs = {}
+_irq_pins = []
+
+
+def set_input(pin, source):
+    inputs[pin] = source
+
+
+def read_input(pin, default=0):
+    source = inputs.get(pin, default)
+    if callable(source):
+        return source(utime.ticks_ms())
+    return source
+
+
+def _poll_irqs(now):
+    for pin in _irq_pins:
+        pin._poll()
+
+
+utime.hooks.append(_poll_irqs)
+_irq_timer = None
+
+
+def set_irq_poll(us):
+    # Pin IRQs are checked at the end of every sleep; also check them every
+    # us of virtual time in between, so short input pulses are not missed.
+    global _irq_timer
+    if _irq_timer is not None:
+        _irq_timer.deinit()
+        _irq_timer = None
+    if us:
+        _irq_timer = Timer(mode=Timer.PERIODIC, period=us / 1000, callback=_poll_irqs)
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=IN, pull=None, value=None):
+        self.id = id
+        self.mode = mode
+        self.out = 0
+        self.handler = None
+        self.trigger = 0
+        self.last = 0
+        if value is not None:
+            self.out = value
+
+    def init(self, mode=IN, pull=None, value=None):
+        self.mode = mode
+        if value is not None:
+            self.out = value
+
+    def value(self, v=None):
+        if v is None:
+            if self.mode == Pin.OUT:
+                return self.out
+            return read_input(self.id)
+        self.out = 1 if v else 0
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def on(self):
+        self.out = 1
+
+    def off(self):
+        self.out = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self.handler = handler
+        self.trigger = trigger
+        self.last = read_input(self.id)
+        if handler is None:
+            if self in _irq_pins:
+                _irq_pins.remove(self)
+        elif self not in _irq_pins:
+            _irq_pins.append(self)
+
+    def _poll(self):
+        v = read_input(self.id)
+        if v != self.last:
+            self.last = v
+            if self.trigger & (Pin.IRQ_RISING if v else Pin.IRQ_FALLING):
+                self.handler(self)
+
+
+class PWM:
+    def __init__(self, pin, freq=None, duty_u16=None):
+        self.pin = pin
+        self.frequency = freq or 1000
+        self.duty = duty_u16 or 0
+
+    def freq(self, f=None):
+        if f is None:
+            return self.frequency
+        self.frequency = f
+
+    def duty_u16(self, d=None):
+        if d is None:
+            return self.duty
+        self.duty = d
+
+    def deinit(self):
+        self.duty = 0
+
+
+class ADC:
+    def __init__(self, pin):
+        self.id = pin.id if isinstance(pin, Pin) else pin
+
+    def read_u16(self):
+        return read_input(self.id)
+
+
+class I2C:
+    def __init__(self, id, sda=None, scl=None, freq=400000):
+        self.id = id
+        self.freq = freq
+        self.transactions = 0
+        self.bytes_written = 0
+
+    def writeto(self, addr, buf, stop=True):
+        self.transactions += 1
+        self.bytes_written += len(buf)
+        return 1
+
+    def writevto(self, addr, vector, stop=True):
+        self.transactions += 1
+        for buf in vector:
+            self.bytes_written += len(buf)
+        return 1
+
+
+class SPI:
+    def __init__(self, id, baudrate=1000000, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self.bytes_written = 0
+
+    def init(self, baudrate=1000000, **kwargs):
+        self.baudrate = baudrate
+
+    def write(self, buf):
+        self.bytes_written += len(buf)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.deadline = 0
+        self.period_us = 0
+        self.mode = Timer.PERIODIC
+        self.callback = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, freq=None, period=None, callback=None):
+        self.deinit()
+        self.mode = mode
+        self.period_us = int(1000000 / freq) if freq else int(period * 1000)
+        self.callback = callback
+        self.deadline = utime.ticks_us() + self.period_us
+        utime.timers.append(self)
+
+    def deinit(self):
+        if self in utime.timers:
+            utime.timers.remove(self)
+
+    def fire(self):
+        if self.mode == Timer.PERIODIC:
+            self.deadline += max(self.period_us, 1)
+        else:
+            self.deinit()
+        if self.callback is not None:
+            self.callback(self)
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+def lightsleep(ms=None):
+    utime.sleep_ms(ms or 0)
+
+
+def deepsleep(ms=None):
+    utime.sleep_ms(ms or 0)
+
+
+def idle():
+    pass
+
+
+def freq(hz=None):
+    return 125000000
+
+
+def unique_id():
+    return b'host0000'
+
+
+def reset():
+    raise SystemExit('machine.reset()')
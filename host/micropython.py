@@ -0,0 +1,25 @@
+# Host stand-in for the micropython module.
+
+def const(x):
+    return x
+
+
+def native(f):
+    return f
+
+
+def viper(f):
+    return f
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(func, arg):
+    func(arg)
+    return True
+
+
+def mem_info(verbose=False):
+    pass
@@ -0,0 +1,59 @@
+# Replay an input trace recorded with Ogreenes(trace=...) as fast as possible
+# and print a hash of the final State:
+#   python host/replay.py trace.bin
+#   python host/replay.py trace.bin --devices --seed 3
+import os
+import sys
+import random
+import argparse
+import time
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HOST, os.path.dirname(HOST)]
+
+import utime
+from eg_state import State
+from eg_trace import read_trace, replay, state_hash
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay an Ogreenes input trace')
+    parser.add_argument('trace')
+    parser.add_argument('--devices', action='store_true',
+                        help='also run display, voice and nose every loop (much slower)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the devices\' randomness')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    record, runs = read_trace(args.trace)
+    devices = None
+    if args.devices:
+        from main import Ogreenes
+        utime.count_work = False
+        fred = Ogreenes()
+        state = fred.state
+        step_us = state.timestep * 1000000
+
+        def devices():
+            fred.dp.render(state)
+            fred.voice.vocalize(state)
+            fred.nose.update(state)
+            # Virtual time only, so background sounds still end
+            utime.advance(step_us)
+    else:
+        state = State()
+
+    start = time.time()
+    replay(state, record, runs, devices)
+    elapsed = time.time() - start
+    loops = sum(run or 1 for run, _, _ in runs)
+    print('%d loops, %d ticks (%.1f h) in %.2fs' % (loops, state.time - record[1],
+                                                    (state.time - record[1]) * state.timestep / 3600,
+                                                    elapsed))
+    print('state %08x  ' % state_hash(state) +
+          ' '.join('%s=%d' % (name, state.headers[name]().value) for name in state.header_names) +
+          ' asleep=%s alive=%s' % (state.asleep, state.alive))
+
+
+if __name__ == '__main__':
+    main()
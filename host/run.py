@@ -0,0 +1,52 @@
+# Run Ogreenes headless on the host backend with a virtual clock:
+#   python host/run.py --ticks 10000 --light 50000 --noise 0.01
+import os
+import sys
+import random
+import argparse
+import time
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HOST, os.path.dirname(HOST)]
+
+import utime
+import machine
+from main import Ogreenes, GP0, GP10, GP27
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ticks', type=int, default=10000, help='stop after this many state ticks (0 runs until death)')
+    parser.add_argument('--light', type=int, default=10000, help='ADC reading of the light sensor, above 40000 is dark')
+    parser.add_argument('--noise', type=float, default=0.0, help='chance per sensor read that the ear hears a sound')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--deterministic', action='store_true', help='do not count host work time on the virtual clock')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    noise = random.Random(args.seed)
+    utime.count_work = not args.deterministic
+    machine.set_input(GP27, args.light)
+    machine.set_input(GP10, lambda t: 1 if noise.random() < args.noise else 0)
+    for gp in range(GP0, GP0 + 3):
+        machine.set_input(gp, 0)
+
+    fred = Ogreenes()
+
+    def stop(now):
+        if args.ticks and fred.state.time >= args.ticks:
+            fred.state.alive = False
+    utime.hooks.append(stop)
+
+    start = time.perf_counter()
+    fred.live()
+    elapsed = time.perf_counter() - start
+    state = fred.state
+    print('%d ticks in %.2fs (%.0f ticks/s), %.1fs virtual' %
+          (state.time, elapsed, state.time / elapsed, utime.ticks_ms() / 1000))
+    print(' '.join('%s=%d' % (name, getter().value) for name, getter in sorted(state.headers.items())),
+          'asleep=%s' % state.asleep)
+
+
+if __name__ == '__main__':
+    main()
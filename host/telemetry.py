@@ -0,0 +1,98 @@
+# Decode a telemetry log written by eg_telemetry.Telemetry to CSV:
+#   python host/telemetry.py telemetry.bin
+#   python host/telemetry.py console.txt   (TLM lines from the serial console)
+import os
+import sys
+import argparse
+import binascii
+import struct
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HOST, os.path.dirname(HOST)]
+
+from eg_telemetry import (RECORD, RECORD_SIZE, FIELDS, ASLEEP, DARK, SOUND, MOODS, MAGIC,
+                          TEXT_PREFIX)
+
+COLUMNS = ('tick', 'age', 'energy', 'happiness', 'arousal', 'attention', 'fatigue',
+           'asleep', 'dark', 'sound', 'mood')
+
+
+def get_varint(data, pos):
+    v = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        v |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            return v, pos
+
+
+def unzigzag(v):
+    return v >> 1 if not v & 1 else -((v + 1) >> 1)
+
+
+def decode_block(data, pos):
+    # One flushed block starting at pos: (records, position after it)
+    if data[pos] != MAGIC:
+        raise ValueError('no telemetry block at byte %d' % pos)
+    n, pos = get_varint(data, pos + 1)
+    record = list(struct.unpack_from(RECORD, data, pos))
+    pos += RECORD_SIZE
+    records = [tuple(record)]
+    while len(records) < n:
+        run, pos = get_varint(data, pos)
+        mask = data[pos]
+        pos += 1
+        delta = [0] * FIELDS
+        for i in range(FIELDS):
+            if mask & (1 << i):
+                v, pos = get_varint(data, pos)
+                delta[i] = unzigzag(v)
+        for _ in range(run):
+            record = [record[i] + delta[i] for i in range(FIELDS)]
+            records.append(tuple(record))
+    return records, pos
+
+
+def decode(data):
+    records = []
+    pos = 0
+    while pos < len(data):
+        block, pos = decode_block(data, pos)
+        records.extend(block)
+    return records
+
+
+def read_log(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if TEXT_PREFIX.encode() not in data:
+        return decode(data)
+    # Serial console capture: a block can span several TLM lines, skip
+    # everything else
+    blocks = bytearray()
+    for line in data.decode(errors='replace').splitlines():
+        if line.startswith(TEXT_PREFIX):
+            blocks.extend(binascii.unhexlify(line[len(TEXT_PREFIX):].strip()))
+    return decode(blocks)
+
+
+def row(record):
+    flags = record[7]
+    return record[:7] + (int(bool(flags & ASLEEP)), int(bool(flags & DARK)),
+                         int(bool(flags & SOUND)), MOODS[flags >> 3])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode an Ogreenes telemetry log to CSV')
+    parser.add_argument('log', help='binary log file or serial console capture')
+    args = parser.parse_args()
+    print(','.join(COLUMNS))
+    for record in read_log(args.log):
+        print(','.join(str(v) for v in row(record)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# Host stand-in for utime with a virtual clock: sleeps advance the clock
+# instantly instead of blocking. With count_work the time spent between
+# sleeps is real host time, so ticks_us still measures work; set it to
+# False for a fully deterministic clock where only sleeps move time.
+import time as _time
+
+count_work = True
+timers = []  # objects with .deadline (us) and .fire(), see machine.Timer
+hooks = []  # called with the new time in us after every sleep
+
+_start_ns = _time.perf_counter_ns()
+_skipped_us = 0
+
+
+def _now_us():
+    if count_work:
+        return (_time.perf_counter_ns() - _start_ns) // 1000 + _skipped_us
+    return _skipped_us
+
+
+def _skip_to(t):
+    global _skipped_us
+    now = _now_us()
+    if t > now:
+        _skipped_us += t - now
+
+
+def advance(us):
+    # Move the clock forward, firing timers at their deadlines on the way
+    end = _now_us() + max(int(us), 0)
+    while True:
+        due = None
+        for timer in timers:
+            if timer.deadline <= end and (due is None or timer.deadline < due.deadline):
+                due = timer
+        if due is None:
+            break
+        _skip_to(due.deadline)
+        due.fire()
+    _skip_to(end)
+    now = _now_us()
+    for hook in hooks:
+        hook(now)
+
+
+def sleep(s):
+    advance(s * 1000000)
+
+
+def sleep_ms(ms):
+    advance(ms * 1000)
+
+
+def sleep_us(us):
+    advance(us)
+
+
+def ticks_us():
+    return _now_us()
+
+
+def ticks_ms():
+    return _now_us() // 1000
+
+
+def ticks_cpu():
+    return _now_us()
+
+
+def ticks_diff(a, b):
+    return a - b
+
+
+def ticks_add(a, delta):
+    return a + delta
+
+
+def time():
+    return _now_us() // 1000000
+
+
+def time_ns():
+    return _now_us() * 1000
@@ -1,7 +1,10 @@
+import gc
 import utime
 import machine
 from eg_state import State
-from eg_utils import Display, Keyboard, Voice, Nose, LightSensor, Ear
+from eg_utils import Display, Keyboard, Voice, Nose, LightSensor, Ear, TIMESTEP
+# Opt-in modules (eg_profile, eg_clock, eg_power, eg_store, eg_telemetry,
+# eg_trace) are imported where they are turned on, to keep boot RAM down
 
 GP0 = 0 # 0, 1, 2, 3 buttons, total 3?
 GP4 = 4 # SDA
@@ -12,16 +15,91 @@ GP16 = 16 # buzzer
 GP25 = 25 # on board led
 GP27 = 27 # ADC1
 
+# Task periods in seconds for live_async. None means event driven (pin IRQ).
+# State and voice run at TIMESTEP: all timebases and mood occurrences count
+# state ticks, and vocalize has to see every tick.
+RATES = {'state': TIMESTEP,
+         'voice': TIMESTEP,
+         'display': 1/10,
+         'nose': 1/20,
+         'light': 1,
+         'ear': 1/50,
+         'keyboard': None}
+
+# Stages of live() timed by the profiler, in order
+STAGES = ('state', 'display', 'voice', 'nose', 'light', 'ear', 'keyboard')
+
 class Ogreenes:
-    def __init__(self):
+    def __init__(self, profile=False, report_every=10, schedule=None, track_changes=False,
+                 power_save=False, persist=False, zero_alloc=False, check_alloc=False,
+                 glyph_cache=False, telemetry=None, trace=None,
+                 partial_refresh=False, eye_cache=0, direct=False, threaded=False,
+                 key_irq=False, ear_counting=False, light_burst=0, nose_lut=False):
         self.state = State()
-        self.dp = Display(sda=GP4, scl=GP5)
-        self.kb = Keyboard(GP0, 3)
+        self.telemetry = None
+        if telemetry:
+            # Record State changes; 'serial' prints them, anything else is
+            # the log file (decode with host/telemetry.py)
+            from eg_telemetry import Telemetry
+            self.telemetry = Telemetry(None if telemetry == 'serial' else telemetry)
+        self.store = None
+        if persist:
+            # Resume from the last snapshot in flash, keep saving on change
+            from eg_store import StateStore
+            self.store = StateStore()
+            self.store.load(self.state)
+        # None sleeps a timestep after each tick's work, 'catchup' or 'drop'
+        # sleeps until the next tick boundary (see TickClock)
+        self.schedule = schedule
+        self.clock = None
+        self.profiler = None
+        if profile:
+            # Per stage timing summary on the serial console every report_every s
+            from eg_profile import TickProfiler
+            self.profiler = TickProfiler(STAGES, self.state.timestep, report_every)
+        # Device modes, see the device classes in eg_utils
+        self.dp = Display(sda=GP4, scl=GP5, partial_refresh=partial_refresh, eye_cache=eye_cache,
+                          direct=direct, threaded=threaded)
+        self.kb = Keyboard(GP0, 3, use_irq=key_irq)
         self.voice = Voice(GP16)
-        self.nose = Nose(GP7)
-        self.light_sensor = LightSensor(GP27)
-        self.ear = Ear(GP10)
+        self.nose = Nose(GP7, use_lut=nose_lut or zero_alloc)
+        self.light_sensor = LightSensor(GP27, burst=light_burst)
+        self.ear = Ear(GP10, counting=ear_counting)
         self.pico_led = machine.Pin(GP25, machine.Pin.OUT)
+        if glyph_cache:
+            # Header redraws blit pre-rendered labels and digits
+            self.dp.header.enable_glyph_cache(self.state)
+        if zero_alloc:
+            # Quiet ticks (no State change) do no float math, string
+            # building or list creation, so they never trigger a GC pause
+            track_changes = True
+            self.dp.preallocate(self.state)
+            self.voice.preallocate()
+        # Debug: raise if a quiet tick allocated (MicroPython only)
+        self.mem_alloc = getattr(gc, 'mem_alloc', None) if check_alloc else None
+        self.recorder = None
+        if trace:
+            # Record the inputs of every live() loop and doze to the file
+            # trace, for host/replay.py
+            from eg_trace import TraceRecorder
+            self.recorder = TraceRecorder(trace, self.state)
+        if track_changes:
+            # Skip device updates whose State inputs did not change,
+            # state.change_stats() reports how many were avoided
+            self.dp.track(self.state)
+            self.voice.track(self.state)
+            self.nose.track(self.state)
+        self.power = None
+        if power_save:
+            # Light sleep while asleep; devices already in IRQ mode wake the
+            # chip by themselves, the polled ones get a wake IRQ.
+            from eg_power import PowerManager
+            wake_pins = []
+            if not self.ear.counting:
+                wake_pins.append(self.ear.sound_detector)
+            if not self.kb.use_irq:
+                wake_pins.extend(self.kb.button)
+            self.power = PowerManager(self, wake_pins)
         self.diagnostics()
 
     def diagnostics(self):
@@ -37,31 +115,151 @@ class Ogreenes:
         self.light_sensor.diagnostics()
 
     def live(self):
+        prof = self.profiler
+        if self.schedule:
+            from eg_clock import TickClock
+            self.clock = TickClock(self.state.timestep, self.schedule)
+        due = 1
         while self.state.alive:
-            # Update state
-            self.state.update()
+            if self.store:
+                self.store.save(self.state)
+            if self.telemetry:
+                self.log_telemetry()
+            if self.power and self.state.asleep:
+                self.power.doze()
+                if self.clock and not self.state.asleep:
+                    # Start counting tick boundaries again from now
+                    self.clock = TickClock(self.state.timestep, self.schedule)
+                continue
+            if self.mem_alloc:
+                recomputes = self.state.recomputes()
+                playing = self.voice.playing
+                mem_before = self.mem_alloc()
+            if prof:
+                prof.start()
+            # Update state, including ticks missed by the clock
+            for _ in range(due):
+                self.state.update()
+            if prof:
+                prof.mark(0)
 
             # Update devices.
             self.dp.render(self.state)
+            if prof:
+                prof.mark(1)
             self.voice.vocalize(self.state)
+            if prof:
+                prof.mark(2)
             self.nose.update(self.state)
+            if prof:
+                prof.mark(3)
             self.light_sensor.update(self.state)
+            if prof:
+                prof.mark(4)
             self.ear.update(self.state)
+            if prof:
+                prof.mark(5)
 
             key = self.kb.read()
-            if key == 0:
-                # Increment current header
-                _, header = self.state.get_header()
-                header().input_update(5)
-            elif key == 1:
-                # Switch to next header
-                _ = self.state.header.add(1)
-
-            utime.sleep(self.state.timestep)
+            self.handle_key(key)
+            if prof:
+                prof.mark(6)
+            if self.mem_alloc:
+                # Only the state and device stages: profiler reports and
+                # trace writes below allocate on purpose
+                grown = self.mem_alloc() - mem_before
+                quiet = (self.state.recomputes() == recomputes and
+                         (playing or not self.voice.playing))
+                assert not (quiet and grown > 0), 'quiet tick allocated %d bytes' % grown
+            if self.recorder:
+                self.recorder.record(due, self.state.env, key)
+            if prof:
+                prof.end()
+
+            if self.clock:
+                due = self.clock.wait()
+            else:
+                utime.sleep(self.state.timestep)
+        self.die()
+
+    def log_telemetry(self):
+        # Flushes are spread over ticks, a few records at a time
+        self.telemetry.sample(self.state, self.voice.mood)
+        self.telemetry.step()
+
+    def handle_key(self, key):
+        self.state.press(key)
+
+    def die(self):
         # Final update before dying
         self.dp.eyes.update_frame(self.state)
-        self.dp.render()
+        self.dp.render(self.state)
+        if self.dp.oled.threaded:
+            # Wait for the final frame, then stop the sender thread
+            self.dp.oled.stop_sender()
+        if self.store:
+            # So the next boot starts a new creature
+            self.store.save(self.state, force=True)
+        if self.telemetry:
+            self.telemetry.sample(self.state, self.voice.mood)
+            self.telemetry.flush()
+        if self.recorder:
+            self.recorder.close()
+
+    def live_async(self, rates=RATES, display_fps=None):
+        # MicroPython only: CPython's asyncio has no ThreadSafeFlag and would
+        # not sleep on the host backend's virtual clock, use live() there
+        for option, on in (('schedule', self.schedule), ('power_save', self.power),
+                           ('profile', self.profiler), ('trace', self.recorder),
+                           ('check_alloc', self.mem_alloc)):
+            if on:
+                raise ValueError(option + ' only works with live()')
+        import uasyncio as asyncio
+        rates = dict(rates)
+        if display_fps:
+            rates['display'] = 1/display_fps
+        asyncio.run(self.run_tasks(asyncio, rates))
+        self.die()
+
+    async def run_tasks(self, asyncio, rates):
+        jobs = {'state': self.state.update,
+                'voice': lambda: self.voice.vocalize(self.state),
+                'display': lambda: self.dp.render(self.state),
+                'nose': lambda: self.nose.update(self.state),
+                'light': lambda: self.light_sensor.update(self.state),
+                'ear': lambda: self.ear.update(self.state),
+                'keyboard': lambda: self.handle_key(self.kb.read())}
+        tasks = []
+        for name, period in rates.items():
+            if period is None:
+                tasks.append(asyncio.create_task(self.run_event(asyncio, jobs[name])))
+            else:
+                tasks.append(asyncio.create_task(self.run_periodic(asyncio, jobs[name], period)))
+        if self.telemetry:
+            tasks.append(asyncio.create_task(self.run_periodic(asyncio, self.log_telemetry, TIMESTEP)))
+        if self.store:
+            # save() itself limits writes to one per min_interval
+            save = lambda: self.store.save(self.state)
+            tasks.append(asyncio.create_task(self.run_periodic(asyncio, save, 1)))
+        while self.state.alive:
+            await asyncio.sleep(TIMESTEP)
+        for task in tasks:
+            task.cancel()
+
+    async def run_periodic(self, asyncio, job, period):
+        while self.state.alive:
+            job()
+            await asyncio.sleep(period)
+
+    async def run_event(self, asyncio, job):
+        # Only the keyboard is event driven: wake on any button edge
+        flag = asyncio.ThreadSafeFlag()
+        self.kb.irq(lambda pin: flag.set())
+        while self.state.alive:
+            await flag.wait()
+            job()
 
 
-fred = Ogreenes()
-fred.live()
+if __name__ == '__main__':
+    fred = Ogreenes()
+    fred.live()
@@ -32,11 +32,19 @@ class SSD1306(framebuf.FrameBuffer):
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        self.shadow = None  # copy of the last buffer sent, for partial refresh
+        self.shadow_valid = False
+        self.bytes_saved = 0  # bytes not sent on the last show()
+        self.bytes_saved_total = 0
+        self.threaded = False  # a second thread does the transfers
+        self.bus = None  # held by whoever is on the bus, when threaded
+        self.cmd_buf = bytearray(32)  # batched commands, see write_cmd_batch
+        self.window = bytearray(6)  # column/page address commands of show()
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
         self.init_display()
 
     def init_display(self):
-        for cmd in (
+        self.write_cmd_batch((
             SET_DISP | 0x00,  # off
             # address setting
             SET_MEM_ADDR,
@@ -66,40 +74,157 @@ class SSD1306(framebuf.FrameBuffer):
             # charge pump
             SET_CHARGE_PUMP,
             0x10 if self.external_vcc else 0x14,
-            SET_DISP | 0x01,
-        ):  # on
-            self.write_cmd(cmd)
+            SET_DISP | 0x01,  # on
+        ))
         self.fill(0)
         self.show()
 
+    def control(self, *cmds):
+        # Commands outside show(), serialized with the sender thread's transfers
+        bus = self.bus
+        if bus is not None:
+            bus.acquire()
+        self.write_cmd_batch(cmds)
+        if bus is not None:
+            bus.release()
+
+    def write_cmd_batch(self, cmds):
+        # Pack consecutive commands into cmd_buf, sent as one transaction
+        n = len(cmds)
+        for i in range(n):
+            self.cmd_buf[i] = cmds[i]
+        self.write_cmds(memoryview(self.cmd_buf)[:n])
+
     def poweroff(self):
-        self.write_cmd(SET_DISP | 0x00)
+        self.control(SET_DISP | 0x00)
 
     def poweron(self):
-        self.write_cmd(SET_DISP | 0x01)
+        self.control(SET_DISP | 0x01)
 
     def contrast(self, contrast):
-        self.write_cmd(SET_CONTRAST)
-        self.write_cmd(contrast)
+        self.control(SET_CONTRAST, contrast)
 
     def invert(self, invert):
-        self.write_cmd(SET_NORM_INV | (invert & 1))
+        self.control(SET_NORM_INV | (invert & 1))
 
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
+    def start_sender(self):
+        # Do transfers on a second thread (core 1 on the RP2040). show() only
+        # hands the frame over; a frame not yet picked up is replaced.
+        import _thread
+        self.lock = _thread.allocate_lock()  # guards pending/frame_ready/running
+        self.bus = _thread.allocate_lock()
+        self.ready = _thread.allocate_lock()  # held while no frame is ready
+        self.ready.acquire()
+        self.done = _thread.allocate_lock()  # held until the sender has ended
+        self.done.acquire()
+        self.frame_ready = False
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.sending = bytearray(len(self.buffer))
+        self.running = True
+        self.pending = bytearray(len(self.buffer))
+        self.threaded = True
+        _thread.start_new_thread(self.sender, ())
+
+    def stop_sender(self):
+        # Send the current buffer as the last frame, return once it is out.
+        # show() transfers inline again after this.
+        self.post(self.buffer, last=True)
+        self.done.acquire()
+        self.threaded = False
+
+    def post(self, buf, last=False):
+        self.lock.acquire()
+        if last:
+            self.running = False
+        self.pending[:] = buf
+        if self.frame_ready:
+            self.frames_dropped += 1
+        else:
+            self.frame_ready = True
+            self.ready.release()
+        self.lock.release()
+
+    def sender(self):
+        while True:
+            self.ready.acquire()
+            self.lock.acquire()
+            self.pending, self.sending = self.sending, self.pending
+            self.frame_ready = False
+            # Read with the swap: once stop_sender() posted, this is its frame
+            running = self.running
+            self.lock.release()
+            self.bus.acquire()
+            self.send(self.sending)
+            self.bus.release()
+            self.frames_sent += 1
+            if not running:
+                self.done.release()
+                return
+
+    def partial_refresh(self, enable=True):
+        # Keep a shadow of the panel RAM so show() only sends changed pages
+        if enable:
+            self.shadow = bytearray(len(self.buffer))
+        else:
+            self.shadow = None
+        self.shadow_valid = False
+        self.bytes_saved = 0
+
+    def write_window(self, x0, x1, page0, page1, buf):
         if self.width == 64:
             # displays with width of 64 pixels are shifted by 32
             x0 += 32
             x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        window = self.window
+        window[0] = SET_COL_ADDR
+        window[1] = x0
+        window[2] = x1
+        window[3] = SET_PAGE_ADDR
+        window[4] = page0
+        window[5] = page1
+        self.write_cmds(window)
+        self.write_data(buf)
+
+    def show(self):
+        if self.threaded:
+            self.post(self.buffer)
+            return
+        self.send(self.buffer)
+
+    def send(self, buf):
+        if self.shadow is not None and self.shadow_valid:
+            self.show_dirty(buf)
+            return
+        self.write_window(0, self.width - 1, 0, self.pages - 1, buf)
+        if self.shadow is not None:
+            self.shadow[:] = buf
+            self.shadow_valid = True
+        self.bytes_saved = 0
 
+    def show_dirty(self, buf):
+        shadow = self.shadow
+        sent = 0
+        if buf != shadow:
+            mv = memoryview(buf)
+            width = self.width
+            for page in range(self.pages):
+                start = page * width
+                end = start + width
+                if buf[start:end] == shadow[start:end]:
+                    continue
+                # Narrow the window to the changed column range of this page
+                first = start
+                while buf[first] == shadow[first]:
+                    first += 1
+                last = end - 1
+                while buf[last] == shadow[last]:
+                    last -= 1
+                self.write_window(first - start, last - start, page, page, mv[first:last + 1])
+                shadow[first:last + 1] = mv[first:last + 1]
+                sent += last + 1 - first
+        self.bytes_saved = len(buf) - sent
+        self.bytes_saved_total += self.bytes_saved
 
 class SSD1306_I2C(SSD1306):
     def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
@@ -107,6 +232,7 @@ class SSD1306_I2C(SSD1306):
         self.addr = addr
         self.temp = bytearray(2)
         self.write_list = [b"\x40", None]  # Co=0, D/C#=1
+        self.cmd_list = [b"\x00", None]  # Co=0, D/C#=0: the rest are commands
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
@@ -114,6 +240,10 @@ class SSD1306_I2C(SSD1306):
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
 
+    def write_cmds(self, cmds):
+        self.cmd_list[1] = cmds
+        self.i2c.writevto(self.addr, self.cmd_list)
+
     def write_data(self, buf):
         self.write_list[1] = buf
         self.i2c.writevto(self.addr, self.write_list)
@@ -146,6 +276,15 @@ class SSD1306_SPI(SSD1306):
         self.spi.write(bytearray([cmd]))
         self.cs(1)
 
+    def write_cmds(self, cmds):
+        # One DC-low burst for all of them
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cs(1)
+        self.dc(0)
+        self.cs(0)
+        self.spi.write(cmds)
+        self.cs(1)
+
     def write_data(self, buf):
         self.spi.init(baudrate=self.rate, polarity=0, phase=0)
         self.cs(1)